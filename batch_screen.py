@@ -0,0 +1,240 @@
+## Batch Screening: Markowitz-Style Analysis over Many Candidate Portfolios, Resumable
+## python batch_screen.py portfolios.txt --output results.csv
+## python batch_screen.py --universe sector.txt --size 5 --output results.parquet --workers 4
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+import datetime
+import itertools
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+import pandas as pd
+
+from port_engine import data
+from port_engine import Moments, portfolio_moments, portfolio_performance, optimize
+
+STRATEGIES = ['EW', 'MCap', 'MSR', 'GMV']
+COLUMNS = (['job_id', 'tickers', 'start', 'end', 'rows'] +
+           ['{} {}'.format(x, y) for x in STRATEGIES for y in ['Return Annual', 'Volatilitas Annual', 'Sharpe Ratio', 'Weights']] +
+           ['error'])
+
+def read_portfolios(path):
+
+    ## One Portfolio per Line, Tickers Separated by Commas, Semicolons or Spaces, '#' Starts a Comment
+    portfolios = []
+    with open(path) as f:
+        for line in f:
+            tickers = [x for x in re.split(r'[,;\s]+', line.split('#')[0].strip().upper()) if x]
+            if len(tickers) > 0:
+                portfolios.append(tickers)
+    return portfolios
+
+def combination_portfolios(universe, size):
+    return [list(x) for x in itertools.combinations(universe, size)]
+
+def job_id(tickers, params):
+    payload = json.dumps([sorted(tickers), params], sort_keys = True)
+    return hashlib.blake2b(payload.encode(), digest_size = 10).hexdigest()
+
+def group_jobs(jobs):
+
+    ## Union-Find over Tickers: Jobs Sharing Any Ticker Load Their Prices Together
+    parent = {}
+    def find(x):
+        while parent.setdefault(x, x) != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+    for _, tickers in jobs:
+        for ticker in tickers[1:]:
+            parent[find(ticker)] = find(tickers[0])
+        find(tickers[0])
+    groups = {}
+    for job in jobs:
+        groups.setdefault(find(job[1][0]), []).append(job)
+
+    ## Jobs Sorted by Tickers so Consecutive Chunks Need Few Columns
+    return [sorted(x, key = lambda job: sorted(job[1])) for x in groups.values()]
+
+def strategy_row(name, weights, moments, rf, tickers):
+    performance = portfolio_performance(weights, moments, rf)
+    row = {'{} {}'.format(name, key): round(value, 3) for key, value in performance.items()}
+    row['{} Weights'.format(name)] = ';'.join('{}:{}'.format(t, round(w, 3)) for t, w in zip(tickers, weights))
+    return row
+
+def screen_chunk(prices, market_value, jobs, rf, solver):
+
+    ## Same Returns as get_data: Dates Where Any Job Ticker Trades, Then Complete Rows Only
+    job_returns = {jid: prices[tickers].dropna(how = 'all').pct_change().dropna() for jid, tickers in jobs}
+
+    ## Forward-Filled Chunk Returns Equal Each Job's Own Returns on that Job's Dates, so Jobs Whose
+    ## Complete-Row Dates are Identical Share One Covariance of Those Panel Rows and Take Sub-Blocks by Index
+    panel = prices.dropna(how = 'all').pct_change()
+    groups = {}
+    for jid, tickers in jobs:
+        groups.setdefault(job_returns[jid].index.asi8.tobytes(), []).append(jid)
+    job_tickers = dict(jobs)
+    shared = {}
+    rows = []
+    for jid, tickers in jobs:
+        row = {'job_id': jid, 'tickers': ';'.join(tickers)}
+        try:
+            returns = job_returns[jid]
+            if len(returns) < 2:
+                raise ValueError('not enough overlapping history')
+            key = returns.index.asi8.tobytes()
+            if len(groups[key]) > 1:
+                if key not in shared:
+                    columns = sorted(set(x for other in groups[key] for x in job_tickers[other]))
+                    shared[key] = (portfolio_moments(panel.loc[returns.index, columns]),
+                                   {x: i for i, x in enumerate(columns)})
+                group_moments, position = shared[key]
+                idx = np.array([position[x] for x in tickers])
+                moments = Moments(group_moments.mean[idx], group_moments.cov[np.ix_(idx, idx)])
+            else:
+                moments = portfolio_moments(returns)
+            row.update({'start': str(returns.index[0].date()), 'end': str(returns.index[-1].date()),
+                        'rows': len(returns)})
+
+            ## Same Strategies as markowitz_portfolio, without the Frontier
+            cap = np.array([market_value.get(x, np.nan) for x in tickers])
+            weights = {'EW': np.full(len(tickers), 1./len(tickers)),
+                       'MCap': cap/np.sum(cap) if np.all(np.isfinite(cap)) and np.sum(cap) > 0 else None,
+                       'MSR': optimize(moments, 'max_sharpe_ratio', rf, solver)['x'],
+                       'GMV': optimize(moments, 'min_volatility', rf, solver)['x']}
+            for name in STRATEGIES:
+                if weights[name] is not None:
+                    row.update(strategy_row(name, weights[name], moments, rf, tickers))
+            row['error'] = ''
+        except Exception as error:
+            row['error'] = '{}: {}'.format(type(error).__name__, error)
+        rows.append(row)
+    return rows
+
+class ResultWriter:
+
+    ## CSV is Appended in Place; Parquet is a Directory of Part Files. The Checkpoint Lists Finished Jobs
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        self.checkpoint = path.rstrip('/') + '.checkpoint'
+        self.parts = 0
+
+    def resume(self):
+
+        ## Drop Anything Written after the Last Complete Checkpoint Entry
+        done, offset, parts = set(), 0, set()
+        try:
+            with open(self.checkpoint) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    done.update(entry['jobs'])
+                    offset = entry.get('offset', offset)
+                    parts.add(entry.get('part'))
+        except OSError:
+            pass
+        if self.parquet:
+            os.makedirs(self.path, exist_ok = True)
+            for name in os.listdir(self.path):
+                if name not in parts:
+                    os.remove(os.path.join(self.path, name))
+            self.parts = len(parts - {None})
+        elif os.path.exists(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(offset)
+        return done
+
+    def write(self, rows):
+        frame = pd.DataFrame(rows).reindex(columns = COLUMNS)
+        entry = {'jobs': frame['job_id'].tolist()}
+        if self.parquet:
+            name = 'part-{:05d}.parquet'.format(self.parts)
+            tmp = os.path.join(self.path, name + '.tmp')
+            frame.to_parquet(tmp, index = False)
+            os.replace(tmp, os.path.join(self.path, name))
+            self.parts += 1
+            entry['part'] = name
+        else:
+            header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            with open(self.path, 'a', newline = '') as f:
+                frame.to_csv(f, index = False, header = header)
+                f.flush()
+                os.fsync(f.fileno())
+                entry['offset'] = f.tell()
+        with open(self.checkpoint, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+def run(portfolios, output, start_date, rf = 0, solver = 'scipy', workers = None, chunk = 200, flush = 1000):
+
+    ## Skip Jobs Already in the Checkpoint, then Load Each Ticker Group's Prices Once
+    params = {'start': str(start_date), 'rf': rf, 'solver': solver}
+    jobs = [(job_id(x, params), x) for x in portfolios]
+    writer = ResultWriter(output)
+    done = writer.resume()
+    jobs = [x for x in jobs if x[0] not in done]
+    groups = group_jobs(list(dict(jobs).items()))
+    workers = workers or os.cpu_count() or 1
+    print('{} portfolios, {} already done, {} to run in {} groups'.format(len(portfolios), len(portfolios) - len(jobs),
+                                                                         len(jobs), len(groups)))
+
+    ## Bounded Number of Chunks in Flight, Results Streamed Out as They Arrive
+    buffer, finished, started = [], 0, time.time()
+    with ProcessPoolExecutor(max_workers = workers) as pool:
+        pending = set()
+        for group in groups:
+            union = sorted(set(itertools.chain.from_iterable(x[1] for x in group)))
+            prices = data.price_store.prices(union, start_date)
+            close = prices['Adj Close']
+            market_value = (prices['Adj Close']*prices['Volume']).ffill().iloc[-1].to_dict()
+            for i in range(0, len(group), chunk):
+                jobs_chunk = group[i:i + chunk]
+                columns = sorted(set(itertools.chain.from_iterable(x[1] for x in jobs_chunk)))
+                pending.add(pool.submit(screen_chunk, close[columns], market_value, jobs_chunk, rf, solver))
+                while len(pending) >= 2*workers:
+                    completed, pending = wait(pending, return_when = FIRST_COMPLETED)
+                    for future in completed:
+                        buffer.extend(future.result())
+                    if len(buffer) >= flush:
+                        finished += len(buffer)
+                        writer.write(buffer)
+                        buffer = []
+                        print('{} / {} done, {:.1f} jobs/s'.format(finished, len(jobs), finished/(time.time() - started)))
+        for future in pending:
+            buffer.extend(future.result())
+    if len(buffer) > 0:
+        finished += len(buffer)
+        writer.write(buffer)
+    print('{} / {} done in {:.1f} s, results in {}'.format(finished, len(jobs), time.time() - started, output))
+    return finished
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Screen many candidate portfolios in batch, resumable')
+    parser.add_argument('portfolios', nargs = '?', help = 'file with one portfolio per line')
+    parser.add_argument('--universe', help = 'file with tickers, screen every combination of --size of them')
+    parser.add_argument('--size', type = int, default = 5)
+    parser.add_argument('--output', required = True, help = 'results .csv file or .parquet directory')
+    parser.add_argument('--start', default = str(datetime.date.today() - datetime.timedelta(365)))
+    parser.add_argument('--rf', type = float, default = 0.0)
+    parser.add_argument('--solver', default = 'scipy')
+    parser.add_argument('--workers', type = int, default = None)
+    parser.add_argument('--chunk', type = int, default = 200)
+    parser.add_argument('--flush', type = int, default = 1000)
+    args = parser.parse_args()
+    if args.universe is not None:
+        universe = sorted(set(itertools.chain.from_iterable(read_portfolios(args.universe))))
+        portfolios = combination_portfolios(universe, args.size)
+    elif args.portfolios is not None:
+        portfolios = read_portfolios(args.portfolios)
+    else:
+        parser.error('give a portfolio file or --universe')
+    start_date = datetime.date.fromisoformat(args.start)
+    run(portfolios, args.output, start_date, args.rf, args.solver, args.workers, args.chunk, args.flush)
@@ -0,0 +1,34 @@
+## Benchmark: Independent, Warm-Started, Adaptive and Parallel Efficient Frontier
+## Run from the repository root with `python -m benchmarks.bench_frontier`
+import os
+import time
+
+import numpy as np
+
+from benchmarks.bench_moments import synthetic_returns
+from port_engine import adaptive_frontier, efficient_frontier, frontier_iterations, optimize, portfolio_moments, portfolio_performance
+
+def main():
+    for num_assets in [5, 30, 100]:
+        moments = portfolio_moments(synthetic_returns(num_assets, 5))
+        gmv = optimize(moments, 'min_volatility')
+        min_exp = portfolio_performance(gmv['x'], moments)['Return Annual']
+        max_exp = np.max(((1 + moments.mean)**252 - 1)*100)
+        range_exp = np.linspace(min_exp, max_exp, 50)
+
+        ## Report Wall Time and Per-Point Iteration Counts for Each Mode
+        modes = {'independent': lambda: efficient_frontier(moments, range_exp),
+                 'warm': lambda: efficient_frontier(moments, range_exp, warm_start = True),
+                 'adaptive': lambda: adaptive_frontier(moments, min_exp, max_exp, 50),
+                 'parallel': lambda: efficient_frontier(moments, range_exp, warm_start = True, workers = None)}
+        print('{} assets, {} cpu'.format(num_assets, os.cpu_count()))
+        for mode, func in modes.items():
+            start = time.perf_counter()
+            ef = func()
+            elapsed = (time.perf_counter() - start)*1e3
+            iterations = frontier_iterations(ef).tolist()
+            print('  {:>11}: {:>8.1f} ms, {:>5} iterations, per point {}'.format(
+                mode, elapsed, sum(iterations), iterations))
+
+if __name__ == '__main__':
+    main()
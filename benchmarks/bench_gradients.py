@@ -0,0 +1,38 @@
+## Benchmark: Optimizer Wall Time with Analytic Gradients vs Finite Differences
+## Run from the repository root with `python -m benchmarks.bench_gradients`
+## Gradient Correctness is Checked in tests/test_optimization.py
+import time
+
+import numpy as np
+from scipy.optimize import minimize
+
+from benchmarks.bench_moments import synthetic_returns
+from port_engine import portfolio_moments, portfolio_performance, optimize
+
+def finite_difference_optimize(moments, target, risk_free_rate = 0):
+
+    ## Same Problem as optimize but Letting SLSQP Estimate the Gradient
+    num_assets = len(moments.mean)
+    initial = num_assets*[1./num_assets,]
+    constraints = ({'type': 'eq', 'fun': lambda x: np.sum(x) - 1})
+    bounds = tuple((0.0,1.0) for asset in range(num_assets))
+    return minimize(portfolio_performance, x0 = initial, args = (moments, risk_free_rate, target),
+                    bounds=bounds, constraints=constraints)
+
+def main():
+    print('{:>7} {:>17} {:>10} {:>10} {:>10} {:>10}'.format(
+        'assets', 'target', 'fd (ms)', 'fd nfev', 'jac (ms)', 'jac nfev'))
+    for num_assets in [5, 50, 200]:
+        moments = portfolio_moments(synthetic_returns(num_assets, 5))
+        for target in ['max_sharpe_ratio', 'min_volatility']:
+            start = time.perf_counter()
+            fd = finite_difference_optimize(moments, target)
+            t_fd = (time.perf_counter() - start)*1e3
+            start = time.perf_counter()
+            jac = optimize(moments, target)
+            t_jac = (time.perf_counter() - start)*1e3
+            print('{:>7} {:>17} {:>10.1f} {:>10} {:>10.1f} {:>10}'.format(
+                num_assets, target, t_fd, fd.nfev, t_jac, jac.nfev))
+
+if __name__ == '__main__':
+    main()
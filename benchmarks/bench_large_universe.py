@@ -0,0 +1,67 @@
+## Benchmark: End-to-End Latency of the Large Universe Mode as the Asset Count Grows
+## Run from the repository root with `python -m benchmarks.bench_large_universe`
+import time
+import datetime
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import port_engine.data
+import port_script
+from benchmarks.bench_moments import synthetic_returns
+from port_engine.price_store import PriceStore
+
+def synthetic_fetcher(returns):
+
+    ## Serve Prices and Volumes from Synthetic Returns Instead of the Network
+    prices = 100*(1 + returns).cumprod()
+    volume = pd.DataFrame(np.random.default_rng(1).integers(1e5, 1e7, prices.shape), index = prices.index,
+                          columns = prices.columns).astype(float)
+    def fetch(tickers, start_date, end_date):
+        window = (prices.index >= pd.Timestamp(start_date)) & (prices.index < pd.Timestamp(end_date))
+        return {x: pd.DataFrame({'Adj Close': prices.loc[window, x], 'Volume': volume.loc[window, x]})
+                for x in tickers}
+    return fetch
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start)*1e3
+
+def main():
+
+    ## Synthetic History Ending Today, get_market_cap Reads the Last Week
+    returns = synthetic_returns(900, 2)
+    returns.index = pd.bdate_range(end = datetime.date.today(), periods = len(returns), name = 'Date')
+    today = returns.index[-1].date()
+    start_date = returns.index[0].date()
+    stages = ['get_data', 'core_plot', 'corr_plot', 'cum_plot', 'markowitz', 'ef_plot', 'strategies']
+    print(('{:>7}' + ' {:>11}'*(len(stages) + 1)).format('assets', *stages, 'total (ms)'))
+    with tempfile.TemporaryDirectory() as root:
+        port_engine.data.price_store = PriceStore(root, synthetic_fetcher(returns),
+                                                  lambda: pd.Timestamp(today) + pd.Timedelta(days = 1))
+        for num_assets in [5, 50, 100, 300, 600, 900]:
+            tickers = [x for x in returns.columns[:num_assets]]
+            port_engine.data.price_store.update(tickers, start_date - datetime.timedelta(7))
+            weights = num_assets*[1./num_assets]
+
+            ## Same Call Sequence as Both App Pages with the Large Universe Settings
+            data, t_data = timed(lambda: port_script.get_data(tickers, start_date, min_coverage = 0.9,
+                                                                     dtype = np.float32))
+            analysis, t_core = timed(lambda: port_script.portfolio_analysis(data, weights))
+            _, t_returns = timed(lambda: analysis.returns)
+            _, t_corr = timed(lambda: port_script.asset_corr_plot(analysis.correlation, analysis.tickers))
+            top = ['Portfolio'] + port_script.top_assets(analysis.cumulative, 5)
+            _, t_cum = timed(lambda: port_script.asset_cumulative_return(analysis.cumulative, top))
+            compiled, t_mark = timed(lambda: port_script.markowitz_portfolio(data, 20, 0, solver = 'qp',
+                                                                             risk_model = 'factor'))
+            _, t_ef = timed(lambda: port_script.visualize_ef(compiled))
+            custom = compiled[2].iloc[-1,3:].values
+            _, t_str = timed(lambda: port_script.cumulative_performance(data, compiled[1], custom / np.sum(custom),
+                                                                        rf = 0, solver = 'qp'))
+            times = [t_data, t_core + t_returns, t_corr, t_cum, t_mark, t_ef, t_str]
+            print(('{:>7}' + ' {:>11.1f}'*(len(stages) + 1)).format(num_assets, *times, sum(times)))
+
+if __name__ == '__main__':
+    main()
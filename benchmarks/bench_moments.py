@@ -0,0 +1,60 @@
+## Benchmark: Per-Evaluation Cost of portfolio_performance
+## Run from the repository root with `python -m benchmarks.bench_moments`
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from port_engine import portfolio_moments, portfolio_performance
+
+def synthetic_returns(num_assets, years, seed = 0):
+
+    ## Daily Returns with a Common Market Factor
+    rng = np.random.default_rng(seed)
+    num_days = 252*years
+    dates = pd.bdate_range('2000-01-03', periods = num_days, name = 'Date')
+    market = rng.normal(0.0004, 0.01, (num_days, 1))
+    beta = rng.uniform(0.5, 1.5, num_assets)
+    noise = rng.normal(0.0002, 0.015, (num_days, num_assets))
+    columns = ['S{:03d}'.format(i) for i in range(num_assets)]
+    return pd.DataFrame(market*beta + noise, index = dates, columns = columns)
+
+def dataframe_performance(weights, my_data, risk_free = 0):
+
+    ## Previous Implementation: Full Pandas Pass over the History per Call
+    port_return = my_data.mul(weights, axis=1).sum(axis=1)
+    annual_return = (((1+np.mean(port_return))**252)-1)*100
+    annual_vol = np.std(port_return) * np.sqrt(252)*100
+    return {'Return Annual':annual_return, 'Volatilitas Annual':annual_vol,
+            'Sharpe Ratio':(annual_return - risk_free)/annual_vol}
+
+def time_call(func, repeat = 5):
+
+    ## Best Average Time per Call in Microseconds
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat = repeat, number = number)) / number * 1e6
+
+def main():
+    print('{:>7} {:>6} {:>14} {:>14} {:>14} {:>9}'.format(
+        'assets', 'years', 'pandas (us)', 'moments (us)', 'setup (us)', 'speedup'))
+    for num_assets in [5, 50, 500]:
+        for years in [1, 5, 10]:
+            my_data = synthetic_returns(num_assets, years)
+            weights = np.full(num_assets, 1./num_assets)
+            moments = portfolio_moments(my_data)
+
+            ## Both Paths Must Agree Before Timing
+            old = dataframe_performance(weights, my_data)
+            new = portfolio_performance(weights, moments)
+            for key in old:
+                assert np.isclose(old[key], new[key], rtol = 1e-9), key
+
+            t_old = time_call(lambda: dataframe_performance(weights, my_data))
+            t_new = time_call(lambda: portfolio_performance(weights, moments))
+            t_setup = time_call(lambda: portfolio_moments(my_data), repeat = 3)
+            print('{:>7} {:>6} {:>14.1f} {:>14.1f} {:>14.1f} {:>8.1f}x'.format(
+                num_assets, years, t_old, t_new, t_setup, t_old / t_new))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+## Benchmark: scipy (Reference) vs Active-Set QP Solver Backends
+## Run from the repository root with `python -m benchmarks.bench_solvers`
+## Agreement Between the Backends is Checked in tests/test_solvers.py
+import time
+
+import numpy as np
+
+from benchmarks.bench_moments import synthetic_returns
+from port_engine import efficient_frontier, optimize, portfolio_moments, portfolio_performance
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start)*1e3
+
+def main():
+    print('{:>7} {:>17} {:>12} {:>12} {:>12}'.format('assets', 'problem', 'scipy (ms)', 'qp (ms)', 'objective'))
+    for num_assets in [5, 30, 100]:
+        moments = portfolio_moments(synthetic_returns(num_assets, 5))
+
+        for target in ['min_volatility', 'max_sharpe_ratio']:
+            reference, t_ref = timed(lambda: optimize(moments, target, 2))
+            qp, t_qp = timed(lambda: optimize(moments, target, 2, solver = 'qp'))
+            print('{:>7} {:>17} {:>12.1f} {:>12.1f} {:>12.4f}'.format(num_assets, target, t_ref, t_qp, qp['fun']))
+
+        ## Fifty Warm-Started Frontier Points per Backend
+        min_exp = portfolio_performance(optimize(moments, 'min_volatility', solver = 'qp')['x'], moments)['Return Annual']
+        max_exp = np.max(((1 + moments.mean)**252 - 1)*100)
+        range_exp = np.linspace(min_exp, max_exp, 50)
+        reference, t_ref = timed(lambda: efficient_frontier(moments, range_exp, warm_start = True))
+        qp, t_qp = timed(lambda: efficient_frontier(moments, range_exp, warm_start = True, solver = 'qp'))
+        print('{:>7} {:>17} {:>12.1f} {:>12.1f}'.format(num_assets, 'frontier (50)', t_ref, t_qp))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+## Benchmark Suite: Wall Time, Peak Memory and Optimizer Iterations of the Analytics Hot Paths
+## Run from the repository root:
+##   python -m benchmarks.suite --save            record benchmarks/baseline.json on this machine
+##   python -m benchmarks.suite                   compare against it, exit code 1 on a regression
+## A Missing Baseline Exits with Code 2, so a CI Gate Never Passes Without Comparing Anything
+import gc
+import os
+import sys
+import json
+import time
+import inspect
+import datetime
+import platform
+import argparse
+import tempfile
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import port_engine
+import port_engine.data
+import port_script
+from benchmarks.bench_moments import synthetic_returns
+from benchmarks.bench_large_universe import synthetic_fetcher
+from port_engine.price_store import PriceStore
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+GRID = {'assets': [5, 30, 100], 'years': [1, 5]}
+QUICK_GRID = {'assets': [5, 30], 'years': [1]}
+
+def uncached(func):
+
+    ## Measure the Computation, Not the Streamlit Cache or Telemetry Wrapper in Front of It
+    return inspect.unwrap(func)
+
+def frontier_nit(efficients):
+    return int(port_engine.frontier_iterations(efficients).sum())
+
+def cases(returns):
+
+    ## (Name, Call, Iteration Count Extractor) for One Synthetic Dataset
+    weights = np.full(returns.shape[1], 1./returns.shape[1])
+    moments = port_engine.portfolio_moments(returns)
+    gmv = port_engine.optimize(moments, 'min_volatility')
+    min_exp = port_engine.portfolio_performance(gmv['x'], moments)['Return Annual']
+    max_exp = float(np.max(((1 + moments.mean)**252 - 1)*100))
+    range_exp = np.linspace(min_exp, max_exp, 50)
+    port_returns = port_engine.PortfolioAnalysis(returns, weights).portfolio.to_frame()
+    compiled = port_engine.markowitz_portfolio(returns, max_exp)
+    custom = compiled[2].iloc[-1,3:].values
+    return [
+        ('core_plot_data', lambda: port_engine.core_plot_data(returns, list(weights)), None),
+        ('portfolio_analysis[summary]', lambda: port_engine.PortfolioAnalysis(returns, weights).summary, None),
+        ('portfolio_performance', lambda: port_engine.portfolio_performance(weights, returns), None),
+        ('portfolio_performance[moments]', lambda: port_engine.portfolio_performance(weights, moments), None),
+        ('optimize[max_sharpe_ratio]', lambda: port_engine.optimize(moments, 'max_sharpe_ratio'), lambda x: int(x['nit'])),
+        ('optimize[min_volatility]', lambda: port_engine.optimize(moments, 'min_volatility'), lambda x: int(x['nit'])),
+        ('efficient_frontier', lambda: port_engine.efficient_frontier(moments, range_exp), frontier_nit),
+        ('efficient_frontier[warm]', lambda: port_engine.efficient_frontier(moments, range_exp, warm_start = True), frontier_nit),
+        ('markowitz_portfolio', lambda: port_engine.markowitz_portfolio(returns, max_exp), None),
+        ('cumulative_performance', lambda: uncached(port_script.cumulative_performance)(returns, compiled[1],
+                                                                                        custom / np.sum(custom)), None),
+        ('var_cvar', lambda: uncached(port_script.var_cvar)(port_returns, 95), None),
+    ]
+
+def measure(func, min_time = 0.2, max_repeat = 5):
+
+    ## Best-of-N Wall Time, then Separate Traced Runs for Peak Memory after a Full Collection
+    times = []
+    while len(times) < max_repeat and (len(times) == 0 or sum(times) < min_time):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    peaks = []
+    for _ in range(2):
+        gc.collect()
+        tracemalloc.start()
+        func()
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return result, min(times)*1e3, min(peaks)/1024
+
+def run(grid, only = None):
+
+    ## Synthetic Prices Ending Today Back the Price Store, markowitz_portfolio Reads Market Caps from It
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        for years in grid['years']:
+            for num_assets in grid['assets']:
+                returns = synthetic_returns(num_assets, years)
+                returns.index = pd.bdate_range(end = datetime.date.today(), periods = len(returns), name = 'Date')
+                port_engine.data.price_store = PriceStore(os.path.join(root, '{}-{}'.format(num_assets, years)),
+                                                          synthetic_fetcher(returns),
+                                                          lambda: returns.index[-1] + pd.Timedelta(days = 1))
+                for name, func, nit in cases(returns):
+                    if only is not None and not any(x in name for x in only):
+                        continue
+                    key = '{}[assets={},years={}]'.format(name, num_assets, years)
+                    result, elapsed, peak = measure(func)
+                    results[key] = {'time_ms': round(elapsed, 3), 'peak_kb': round(peak, 1),
+                                    'nit': nit(result) if nit is not None else None}
+                    print('{:<62} {:>10.2f} ms {:>10.0f} KB {:>6}'.format(key, elapsed, peak,
+                                                                       results[key]['nit'] if nit is not None else ''))
+    return results
+
+def compare(results, baseline, time_tolerance, memory_tolerance, nit_tolerance):
+
+    ## Relative Tolerances with Small Absolute Floors, Sub-Millisecond Noise Never Fails a Run
+    regressions = []
+    for key, new in results.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        checks = [('time_ms', time_tolerance, 1.0), ('peak_kb', memory_tolerance, 64.0), ('nit', nit_tolerance, 0)]
+        for field, tolerance, floor in checks:
+            if new[field] is None or old[field] is None:
+                continue
+            if new[field] > old[field]*(1 + tolerance) and new[field] - old[field] > floor:
+                regressions.append('{} {}: {} -> {} ({:+.0f}%)'.format(key, field, old[field], new[field],
+                                                                       (new[field]/max(old[field], 1e-12) - 1)*100))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark the analytics hot paths against a JSON baseline')
+    parser.add_argument('--save', action = 'store_true', help = 'write the results as the new baseline')
+    parser.add_argument('--baseline', default = BASELINE)
+    parser.add_argument('--quick', action = 'store_true', help = 'small grid for a fast check')
+    parser.add_argument('--only', nargs = '*', help = 'run only cases whose name contains one of these')
+    parser.add_argument('--time-tolerance', type = float, default = 0.25)
+    parser.add_argument('--memory-tolerance', type = float, default = 0.25)
+    parser.add_argument('--nit-tolerance', type = float, default = 0.10)
+    parser.add_argument('--allow-missing-baseline', action = 'store_true',
+                        help = 'exit with code 0 instead of 2 when there is no baseline to compare against')
+    args = parser.parse_args()
+
+    results = run(QUICK_GRID if args.quick else GRID, args.only)
+    if args.save:
+        meta = {'created': datetime.datetime.now().isoformat(timespec = 'seconds'), 'python': platform.python_version(),
+                'numpy': np.__version__, 'pandas': pd.__version__, 'machine': platform.machine(), 'cpus': os.cpu_count()}
+        with open(args.baseline, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent = 1, sort_keys = True)
+        print('Saved {} results to {}'.format(len(results), args.baseline))
+        return 0
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    except (OSError, ValueError, KeyError):
+        print('No baseline at {}, run with --save first'.format(args.baseline))
+        return 0 if args.allow_missing_baseline else 2
+    regressions = compare(results, baseline, args.time_tolerance, args.memory_tolerance, args.nit_tolerance)
+    for line in regressions:
+        print('REGRESSION ' + line)
+    print('{} regressions against {}'.format(len(regressions), args.baseline))
+    return 1 if len(regressions) > 0 else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
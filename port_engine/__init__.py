@@ -0,0 +1,29 @@
+## Headless Compute Engine: Plain DataFrames and Arrays, No Streamlit, Plotly or bs4 at Import
+from port_engine.returns import ReturnsMatrix, as_returns
+from port_engine.data import get_ticker, get_data, get_market_cap, index_moments, LOOKBACKS
+from port_engine.market_data import FetchError, MissingPrices
+from port_engine.metrics import (PortfolioAnalysis, core_plot_data, var_cvar_values,
+                                 cluster_order, top_assets, simulate_var_cvar, Moments, FactorCov, factor_moments,
+                                 portfolio_moments, portfolio_performance, batch_performance, evaluate_portfolios,
+                                 portfolio_gradient)
+from port_engine.optimization import (scipy_optimize, scipy_efficient_return, active_set_qp, qp_optimize,
+                                      qp_frontier_point, qp_efficient_return, SOLVERS, get_solver, optimize,
+                                      efficient_return, efficient_frontier, parallel_frontier, adaptive_frontier,
+                                      frontier_iterations, frontier_table, markowitz_portfolio)
+from port_engine.downsampling import MAX_POINTS, RECENT_POINTS, minmax_indices, downsample
+from port_engine.rolling import RollingEngine
+from port_engine.backtesting import (rebalance_schedule, backtest, backtest_portfolios, InsufficientHistory,
+                                     walk_forward, strategy_returns)
+
+__all__ = ['ReturnsMatrix', 'as_returns',
+           'get_ticker', 'get_data', 'get_market_cap', 'index_moments', 'LOOKBACKS', 'FetchError', 'MissingPrices',
+           'PortfolioAnalysis', 'core_plot_data', 'var_cvar_values', 'cluster_order',
+           'top_assets', 'simulate_var_cvar', 'Moments', 'FactorCov', 'factor_moments', 'portfolio_moments',
+           'portfolio_performance', 'batch_performance', 'evaluate_portfolios', 'portfolio_gradient',
+           'scipy_optimize', 'scipy_efficient_return', 'active_set_qp', 'qp_optimize', 'qp_frontier_point',
+           'qp_efficient_return', 'SOLVERS', 'get_solver', 'optimize', 'efficient_return', 'efficient_frontier',
+           'parallel_frontier', 'adaptive_frontier', 'frontier_iterations', 'frontier_table', 'markowitz_portfolio',
+           'MAX_POINTS', 'RECENT_POINTS', 'minmax_indices', 'downsample',
+           'RollingEngine',
+           'rebalance_schedule', 'backtest', 'backtest_portfolios', 'InsufficientHistory', 'walk_forward',
+           'strategy_returns']
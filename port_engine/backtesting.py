@@ -0,0 +1,186 @@
+## Backtesting: Rebalancing Schedules, Transaction Costs and Walk-Forward Re-Optimization
+import numpy as np
+import pandas as pd
+
+from port_engine.telemetry import traced
+
+from port_engine.metrics import Moments
+from port_engine.optimization import optimize
+from port_engine.returns import ReturnsMatrix
+
+class InsufficientHistory(ValueError):
+    pass
+
+def rebalance_schedule(dates, rebalance):
+
+    ## True on the Last Trading Day of Each Calendar Period
+    periods = {'monthly': 'M', 'quarterly': 'Q'}
+    if rebalance not in periods:
+        return np.zeros(len(dates), dtype = bool)
+    if not isinstance(dates, pd.DatetimeIndex):
+        raise ValueError('Calendar rebalancing needs returns indexed by date')
+    labels = dates.to_period(periods[rebalance]).asi8
+    period_end = np.zeros(len(dates), dtype = bool)
+    period_end[:-1] = labels[1:] != labels[:-1]
+    return period_end
+
+def backtest(my_data, weights, rebalance = 'daily', threshold = 0.05, cost = 0.0, chunk = 252):
+
+    ## Rebalancing Backtest for One Target Weight Vector, Costs are Proportional to Traded Value
+    if rebalance not in ['daily', 'none', 'monthly', 'quarterly', 'threshold']:
+        raise ValueError('Unknown rebalance {!r}'.format(rebalance))
+    values = np.asarray(my_data, dtype = float)
+    weights = np.asarray(weights, dtype = float)
+    num_days, num_assets = values.shape
+    turnover = np.zeros(num_days)
+
+    ## Daily Rebalancing: Drift for One Day, then Trade Back to Target
+    if rebalance == 'daily':
+        gross = values.dot(weights)
+        drift = weights*(1+values) / (1+gross)[:,None]
+        turnover[1:] = np.abs(drift[:-1] - weights).sum(axis = 1)
+        net = (1 - cost*turnover)*(1+gross) - 1
+        return net, turnover
+
+    ## Otherwise Holdings Drift Between Rebalances, Processed Chunk by Chunk
+    ## Chunks Restart Small After Each Rebalance and Double Up to chunk Rows, so Rows Past a Trigger are
+    ## Wasted at Most Once per Doubling: O(days x assets) Overall Even When Every Day Rebalances
+    dates = my_data.index if isinstance(my_data, (pd.DataFrame, ReturnsMatrix)) else None
+    period_end = rebalance_schedule(dates, rebalance) if rebalance in ['monthly', 'quarterly'] else None
+    gross = np.empty(num_days)
+    growth = np.ones(num_assets)
+    first = min(16, chunk)
+    size = first
+    t = 0
+    while t < num_days:
+        stop = min(t + size, num_days)
+        asset_growth = growth * np.cumprod(1+values[t:stop], axis = 0)
+        wealth = asset_growth.dot(weights)
+        previous = np.concatenate([[growth.dot(weights)], wealth[:-1]])
+        chunk_return = wealth/previous - 1
+
+        ## First Rebalance Trigger in This Chunk
+        if rebalance == 'threshold':
+            drift = asset_growth*weights / wealth[:,None]
+            trigger = np.abs(drift - weights).max(axis = 1) > threshold
+        elif rebalance == 'none':
+            trigger = np.zeros(stop - t, dtype = bool)
+        else:
+            trigger = period_end[t:stop]
+        hits = np.flatnonzero(trigger)
+        if len(hits) > 0 and t + hits[0] < num_days - 1:
+            
+            ## Trade Back to Target at the Close, Cost Hits the Next Day's Return
+            i = hits[0]
+            gross[t:t+i+1] = chunk_return[:i+1]
+            drift = asset_growth[i]*weights / wealth[i]
+            turnover[t+i+1] = np.abs(drift - weights).sum()
+            growth = np.ones(num_assets)
+            t = t + i + 1
+            size = first
+        else:
+            gross[t:stop] = chunk_return
+            growth = asset_growth[-1]
+            t = stop
+            size = min(2*size, chunk)
+    net = (1 - cost*turnover)*(1+gross) - 1
+    return net, turnover
+
+@traced('backtest_portfolios', args = ['rebalance'])
+def backtest_portfolios(my_data, weight_matrix, names, rebalance = 'daily', threshold = 0.05, cost = 0.0):
+
+    ## Same Backtest for Several Strategies, Labelled Like cum_df
+    weight_matrix = np.atleast_2d(np.asarray(weight_matrix, dtype = float))
+    results = [backtest(my_data, weights, rebalance, threshold, cost) for weights in weight_matrix]
+    index = my_data.index if isinstance(my_data, (pd.DataFrame, ReturnsMatrix)) else None
+    net = pd.DataFrame(np.column_stack([x[0] for x in results]), index = index, columns = names)
+    turnover = pd.DataFrame(np.column_stack([x[1] for x in results]), index = index, columns = names)
+    cumulative = (net + 1).cumprod() - 1
+    summary = pd.DataFrame({'Turnover': turnover.sum(), 'Jumlah Rebalancing': (turnover > 0).sum(),
+                            'Biaya Transaksi (%)': (cost*turnover).sum()*100})
+    return {'returns': net, 'cumulative': cumulative, 'turnover': turnover, 'summary': summary}
+
+@traced('walk_forward', args = ['target', 'solver'])
+def walk_forward(my_data, target = 'max_sharpe_ratio', lookback = 252, window = 'rolling', rebalance = 'monthly',
+                 risk_free_rate = 0, solver = 'scipy', cost = 0.0):
+
+    ## Re-Optimize at Each Rebalance Close on the Lookback Window, Hold the Weights Over the Next Period
+    values = np.asarray(my_data, dtype = float)
+    num_days, num_assets = values.shape
+    if isinstance(rebalance, int):
+        ends = np.arange(lookback - 1, num_days, rebalance)
+    else:
+        ends = np.flatnonzero(rebalance_schedule(my_data.index, rebalance))
+    ends = ends[(ends >= lookback - 1) & (ends < num_days - 1)]
+    if len(ends) == 0:
+        raise InsufficientHistory('Not enough history for a {} day lookback'.format(lookback))
+
+    ## Running Sums of Returns and Cross Products, Updated Only by Rows Entering or Leaving the Window
+    total = np.zeros(num_assets)
+    cross = np.zeros((num_assets, num_assets))
+    start, stop = 0, 0
+    weights, iterations = [], []
+    initial = None
+    for end in ends:
+        new_stop = end + 1
+        new_start = new_stop - lookback if window == 'rolling' else 0
+        entering, leaving = values[stop:new_stop], values[start:new_start]
+        total += entering.sum(axis = 0) - leaving.sum(axis = 0)
+        cross += entering.T.dot(entering) - leaving.T.dot(leaving)
+        start, stop = new_start, new_stop
+        mean = total / (stop - start)
+        moments = Moments(mean, cross / (stop - start) - np.outer(mean, mean))
+
+        ## Warm Start from the Previous Window's Solution
+        result = optimize(moments, target, risk_free_rate, solver, initial)
+        initial = result['x']
+        weights.append(result['x'])
+        iterations.append(result['nit'])
+
+    ## Out-of-Sample Returns: Holdings Drift Within Each Period, Costs on Rebalancing Trades
+    net = np.empty(num_days - ends[0] - 1)
+    turnover = np.zeros(len(net))
+    bounds = list(ends + 1) + [num_days]
+    drift = None
+    for i, target_weights in enumerate(weights):
+        a, b = bounds[i], bounds[i+1]
+        asset_growth = np.cumprod(1+values[a:b], axis = 0)
+        wealth = asset_growth.dot(target_weights)
+        period_return = wealth / np.concatenate([[1.0], wealth[:-1]]) - 1
+        if drift is not None:
+            turnover[a - bounds[0]] = np.abs(target_weights - drift).sum()
+        net[a - bounds[0]:b - bounds[0]] = period_return
+        drift = asset_growth[-1]*target_weights / wealth[-1]
+    net = (1 - cost*turnover)*(1+net) - 1
+
+    ## Organize Results
+    index = my_data.index if isinstance(my_data, (pd.DataFrame, ReturnsMatrix)) else np.arange(num_days)
+    columns = my_data.columns if isinstance(my_data, (pd.DataFrame, ReturnsMatrix)) else None
+    return {'returns': pd.Series(net, index = index[ends[0]+1:]),
+            'turnover': pd.Series(turnover, index = index[ends[0]+1:]),
+            'weights': pd.DataFrame(weights, index = index[ends], columns = columns),
+            'iterations': iterations}
+
+@traced('strategy_returns')
+def strategy_returns(my_data, port_strategy, cust_weight, rebalance = 'daily', cost = 0.0, threshold = 0.05,
+                     walk_forward_lookback = None, rf = 0, solver = 'scipy'):
+    
+    ## Cumulative Returns DataFrame and Turnover Summary, All Strategies in One Batch
+    weight_matrix = np.vstack([cust_weight, port_strategy.iloc[0:4,3:].values])
+    names = ['Custom', 'EW', 'MCap', 'MSR', 'GMV']
+    evaluasi = backtest_portfolios(my_data, weight_matrix, names, rebalance, threshold, cost)
+    cum_df = round(evaluasi['cumulative'], 3)
+    summary = evaluasi['summary']
+
+    ## Out-of-Sample MSR and GMV, Re-Fitted Monthly on the Trailing Lookback Only
+    ## Left Out When the History is Shorter than the Lookback, the Caller Checks for the Columns
+    if walk_forward_lookback is not None:
+        for name, target in [('MSR (Walk-Forward)', 'max_sharpe_ratio'), ('GMV (Walk-Forward)', 'min_volatility')]:
+            try:
+                wf = walk_forward(my_data, target, walk_forward_lookback, risk_free_rate = rf, solver = solver,
+                                  cost = cost)
+            except InsufficientHistory:
+                break
+            cum_df[name] = round((wf['returns'] + 1).cumprod() - 1, 3)
+            summary.loc[name] = [wf['turnover'].sum(), (wf['turnover'] > 0).sum(), (cost*wf['turnover']).sum()*100]
+    return cum_df, round(summary, 3)
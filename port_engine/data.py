@@ -0,0 +1,67 @@
+## Data Layer: Ticker Universe, Local Price Store and Nightly Statistics Index
+import datetime
+
+import numpy as np
+
+from port_engine.price_store import PriceStore
+from port_engine.market_data import shared_fetcher, MissingPrices
+from port_engine.ticker_universe import load_tickers
+from port_engine.stats_index import StatsIndex, LOOKBACKS
+from port_engine.telemetry import traced
+from port_engine.metrics import Moments
+from port_engine.returns import ReturnsMatrix
+
+## Module-Level Stores, Replace to Point the Engine at Another Root or Fetcher
+## The Chart Fetcher and its HTTP Session are Created on the First Download, Not at Import
+price_store = PriceStore(fetcher = shared_fetcher)
+stats_index = StatsIndex()
+
+def get_ticker():
+    
+    ## Disk-Cached Ticker Universe, Refreshed in the Background Once Stale
+    return load_tickers()
+
+@traced('data.get_data')
+def get_data(tickers, start_date, min_coverage = None, dtype = np.float64):
+    
+    ## Read Prices from the Local Store, Downloading Only Missing Dates
+    failed = price_store.update(tickers, start_date)
+    prices = price_store.prices(tickers, start_date, update = False)['Adj Close']
+    
+    ## A Ticker Left Without Prices Raises Instead of Emptying the Matrix, so a Cache Never Keeps the Failure
+    ## Large Universes Skip Tickers that Simply Have No History, but Not Ones Whose Download Failed
+    empty = [x for x in tickers if prices[x].isna().all()]
+    missing = {x: failed.get(x, 'no prices since {}'.format(start_date)) for x in empty
+               if x in failed or min_coverage is None}
+    if len(missing) > 0:
+        raise MissingPrices(missing)
+    
+    ## Large Universes: Drop Late Listings and Sparse Tickers Instead of Truncating Every Column's History
+    if min_coverage is not None:
+        prices = prices.loc[:, prices.notna().mean() >= min_coverage]
+        prices = prices.loc[prices.first_valid_index():]
+    data_returns = prices.pct_change().dropna()
+    if len(data_returns) == 0 and min_coverage is None:
+        raise MissingPrices({x: 'no overlapping dates since {}'.format(start_date) for x in prices.columns})
+    
+    ## Immutable Returns Matrix, float32 Halves Memory for Large Universes
+    return ReturnsMatrix.from_frame(data_returns, dtype)
+
+@traced('data.get_market_cap')
+def get_market_cap(tickers):
+    
+    ## Recent Prices and Volume from the Local Store
+    start_date = datetime.date.today() - datetime.timedelta(7)
+    prices = price_store.prices(tickers, start_date)
+    
+    recent_market = (prices['Adj Close']*prices['Volume']).iloc[-1]
+    market_weight = recent_market.div(sum(recent_market)).tolist()
+    return market_weight
+
+def index_moments(tickers, lookback):
+
+    ## Moments Assembled from the Nightly Statistics Index, None if the Index Cannot Serve the Request
+    indexed = stats_index.moments(tickers, lookback)
+    if indexed is None:
+        return None
+    return Moments(*indexed)
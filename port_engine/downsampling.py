@@ -0,0 +1,42 @@
+## Plot Decimation: Per-Bucket Min/Max so Payload Size is Bounded and Extremes Stay Exact
+import numpy as np
+import pandas as pd
+
+## Points per Figure, and the Recent Rows Kept at Full Resolution for the 1 Month to 1 Year Range Buttons
+MAX_POINTS = 2000
+RECENT_POINTS = 252
+
+def minmax_indices(values, buckets):
+
+    ## Equal-Width Buckets over the Rows, Each Keeps the Row of its Minimum and its Maximum per Column
+    values = np.asarray(values, dtype = float)
+    if values.ndim == 1:
+        values = values[:, None]
+    n = len(values)
+    width = -(-n // buckets)
+    buckets = -(-n // width)
+    padded = np.full((buckets*width, values.shape[1]), np.nan)
+    padded[:n] = values
+    padded = padded.reshape(buckets, width, values.shape[1])
+    offset = (np.arange(buckets)*width)[:, None]
+    low = np.argmin(np.where(np.isnan(padded), np.inf, padded), axis = 1) + offset
+    high = np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis = 1) + offset
+    return np.unique(np.concatenate([low.ravel(), high.ravel(), [0, n - 1]]))
+
+def downsample(frame, max_points = MAX_POINTS, recent = RECENT_POINTS, columns = None):
+
+    ## Short Histories are Returned Unchanged, Longer Ones Keep the Recent Tail and Decimate the Rest
+    n = len(frame)
+    if n <= max_points + recent:
+        return frame
+    if isinstance(frame, pd.Series):
+        values = frame.values[:, None]
+    else:
+        columns = columns or [x for x in frame.columns if pd.api.types.is_numeric_dtype(frame[x])]
+        values = frame[columns].values
+
+    ## Budget Split Across Columns, the Union of Their Rows Stays Within max_points
+    head = n - recent
+    buckets = max(max_points // (2*values.shape[1]), 1)
+    keep = np.union1d(minmax_indices(values[:head], buckets), np.arange(head, n))
+    return frame.iloc[keep]
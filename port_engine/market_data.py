@@ -0,0 +1,171 @@
+## Market Data Fetch Layer: Concurrent Per-Ticker Chart Requests, Pooled Session, Rate Limit and Retries
+## One Chart Request Returns Adjusted Close and Volume Together, Set MARKET_DATA_URL to Point at a Local Fake Server
+import os
+import json
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from port_engine import telemetry
+from port_engine.price_store import FIELDS
+
+BASE_URL = os.environ.get('MARKET_DATA_URL', 'https://query1.finance.yahoo.com')
+RATE = float(os.environ.get('MARKET_DATA_RATE', 10))
+RETRY_STATUS = [429, 500, 502, 503, 504]
+logger = logging.getLogger('portfolio.market_data')
+
+class FetchError(Exception):
+    pass
+
+class MissingPrices(FetchError):
+
+    ## Raised by get_data, failed Maps Each Ticker Without Prices to the Reason
+    def __init__(self, failed):
+        super().__init__('No prices for {}'.format(', '.join('{} ({})'.format(x, y) for x, y in failed.items())))
+        self.failed = failed
+
+class FetchResult(dict):
+
+    ## {ticker: frame} for the Tickers that Arrived, plus the Failures of this Call Only
+    def __init__(self, frames = None, failed = None):
+        super().__init__(frames or {})
+        self.failed = failed or {}
+
+class TokenBucket:
+
+    ## Refills rate Tokens per Second up to burst, acquire Blocks Until a Token is Free
+    def __init__(self, rate, burst = None, clock = time.monotonic, sleep = time.sleep):
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self.tokens = self.burst
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated)*self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens)/self.rate
+            self.sleep(wait)
+
+class RequestsTransport:
+
+    ## Keep-Alive Connections Pooled in One Session and Shared by Every Worker Thread
+    ## Any Callable (url, params) -> (status, headers, body) Can Replace It
+    def __init__(self, pool_size = 16, timeout = 10):
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections = pool_size, pool_maxsize = pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['User-Agent'] = 'Mozilla/5.0'
+        self.timeout = timeout
+
+    def __call__(self, url, params):
+        response = self.session.get(url, params = params, timeout = self.timeout)
+        return response.status_code, response.headers, response.content
+
+def epoch(date):
+    return int((pd.Timestamp(date) - pd.Timestamp('1970-01-01')).total_seconds())
+
+def parse_chart(body):
+
+    ## Chart JSON to a Date-Indexed Frame of FIELDS, Bars Shifted to the Exchange's Local Date
+    chart = json.loads(body)['chart']
+    if chart.get('error'):
+        raise FetchError(chart['error'].get('description', chart['error']))
+    result = chart['result'][0]
+    timestamps = np.asarray(result.get('timestamp') or [], dtype = np.int64)
+    if len(timestamps) == 0:
+        return pd.DataFrame(columns = FIELDS, dtype = float)
+    dates = pd.to_datetime(timestamps + int(result['meta'].get('gmtoffset', 0)), unit = 's').normalize()
+    quote = result['indicators']['quote'][0]
+    adjclose = result['indicators'].get('adjclose', [{}])[0].get('adjclose') or quote['close']
+    frame = pd.DataFrame({'Adj Close': adjclose, 'Volume': quote['volume']}, index = pd.DatetimeIndex(dates, name = 'Date'),
+                         dtype = float)
+    return frame[~frame.index.duplicated(keep = 'last')].dropna(how = 'all')
+
+class ChartFetcher:
+
+    ## Same Contract as yahoo_fetcher, so it Plugs into PriceStore: {ticker: DataFrame of FIELDS}
+    def __init__(self, transport = None, base_url = BASE_URL, workers = 8, rate = RATE, burst = None, retries = 4,
+                 backoff = 0.5, suffix = '.JK', sleep = time.sleep):
+        self.transport = transport or RequestsTransport(pool_size = workers)
+        self.base_url = base_url.rstrip('/')
+        self.workers = workers
+        self.bucket = TokenBucket(rate, burst, sleep = sleep)
+        self.retries = retries
+        self.backoff = backoff
+        self.suffix = suffix
+        self.sleep = sleep
+
+    def request(self, ticker, start_date, end_date):
+        url = '{}/v8/finance/chart/{}'.format(self.base_url, ticker + self.suffix)
+        params = {'period1': epoch(start_date), 'period2': epoch(end_date), 'interval': '1d',
+                  'events': 'div,splits', 'includeAdjustedClose': 'true'}
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            retry_after = None
+            try:
+                with telemetry.span('market_data.request', ticker = ticker, attempt = attempt) as current:
+                    status, headers, body = self.transport(url, params)
+                    current.set(status = status)
+            except OSError as error:
+                problem = '{}: {}'.format(type(error).__name__, error)
+            else:
+                if status == 200:
+                    return parse_chart(body)
+                if status not in RETRY_STATUS:
+                    raise FetchError('{} returned HTTP {}'.format(ticker, status))
+                problem = 'HTTP {}'.format(status)
+                retry_after = headers.get('Retry-After')
+
+            ## Exponential Backoff with Jitter, a Server's Retry-After Wins When Longer
+            if attempt < self.retries:
+                delay = self.backoff * 2**attempt * (0.5 + random.random())
+                try:
+                    delay = max(delay, float(retry_after))
+                except (TypeError, ValueError):
+                    pass
+                self.sleep(delay)
+        raise FetchError('{} failed after {} attempts, last error {}'.format(ticker, self.retries + 1, problem))
+
+    def __call__(self, tickers, start_date, end_date):
+
+        ## Bounded Thread Pool, Failed Tickers are Left Out of the Result and Listed in its failed
+        ## Nothing is Kept on the Fetcher, so Sessions Sharing it Never See Each Other's Failures
+        result = FetchResult()
+        if len(tickers) == 0:
+            return result
+        with ThreadPoolExecutor(max_workers = min(self.workers, len(tickers))) as pool:
+            futures = {x: pool.submit(self.request, x, start_date, end_date) for x in tickers}
+            for ticker, future in futures.items():
+                try:
+                    result[ticker] = future.result()
+                except (FetchError, ValueError, KeyError, IndexError, TypeError) as error:
+                    result.failed[ticker] = str(error)
+                    logger.warning('Could not fetch %s: %s', ticker, error)
+        return result
+
+## One Process-Wide ChartFetcher, Built on the First Download so Importing the Engine Opens No Session
+shared = {}
+shared_lock = threading.Lock()
+
+def shared_fetcher(tickers, start_date, end_date):
+    with shared_lock:
+        if 'fetcher' not in shared:
+            shared['fetcher'] = ChartFetcher()
+    return shared['fetcher'](tickers, start_date, end_date)
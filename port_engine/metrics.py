@@ -0,0 +1,380 @@
+## Portfolio Metrics: Moments, Performance, Drawdown and Risk
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from port_engine.telemetry import traced, span
+
+from port_engine.returns import ReturnsMatrix, as_returns
+
+class PortfolioAnalysis:
+
+    ## Lazy Analysis of One Weighted Portfolio: Each Panel is Computed on First Access and Memoized
+    ## Shared Intermediates (Portfolio Returns, its Cumulative Return and Drawdown) are Computed Once
+    def __init__(self, returns, weights, conf = 95):
+        self.data = as_returns(returns)
+        self.weights = np.asarray(weights, dtype = float)
+        self.conf = conf
+        self.tickers = [x for x in self.data.columns]
+        self.panels = {}
+
+    def panel(self, name, compute, *args):
+        key = (name,) + args
+        if key not in self.panels:
+            with span('analysis.' + name):
+                self.panels[key] = compute()
+        return self.panels[key]
+
+    @property
+    def portfolio(self):
+        return self.panel('portfolio', lambda: pd.Series(self.data.portfolio(self.weights), index = self.data.index,
+                                                         name = 'Portfolio'))
+
+    @property
+    def returns(self):
+
+        ## Display Frame of Asset Returns plus the Portfolio Column, the Input Matrix is Never Modified
+        def compute():
+            frame = self.data.to_frame()
+            frame['Portfolio'] = self.portfolio.values
+            return frame
+        return self.panel('returns', compute)
+
+    @property
+    def portfolio_cumulative(self):
+        return self.panel('portfolio_cumulative', lambda: round((self.portfolio + 1).cumprod() - 1, 3))
+
+    @property
+    def cumulative(self):
+
+        ## Wide Cumulative Returns, Portfolio First, Columns Named 'Perusahaan' for the Faceted Chart
+        def compute():
+            ret_cum = round((self.data.to_frame() + 1).cumprod() - 1, 3)
+            ret_cum.insert(0, 'Portfolio', self.portfolio_cumulative)
+            ret_cum.columns.name = 'Perusahaan'
+            return ret_cum
+        return self.panel('cumulative', compute)
+
+    @property
+    def correlation(self):
+        return self.panel('correlation', lambda: np.round(np.corrcoef(self.data.values, rowvar = False), 3))
+
+    def drawdown_series(self):
+
+        ## Drawdown and Running Max Drawdown from the Portfolio's Cumulative Return Only
+        def compute():
+            wealth = self.portfolio_cumulative.add(1)
+            drawdown = wealth.div(np.maximum.accumulate(wealth)).sub(1)
+            return drawdown, np.minimum.accumulate(drawdown)
+        return self.panel('drawdown_series', compute)
+
+    @property
+    def drawdown(self):
+        def compute():
+            hist_draw = round(pd.DataFrame(list(self.drawdown_series())).transpose(), 3)
+            hist_draw.columns = ['Drawdown', 'Max Drawdown']
+            return hist_draw.reset_index()
+        return self.panel('drawdown', compute)
+
+    def var_cvar(self, conf = None):
+        conf = conf or self.conf
+        return self.panel('var_cvar', lambda: var_cvar_values(self.portfolio.to_frame(), conf), conf)
+
+    @property
+    def summary(self):
+
+        ## Recap Key Value
+        def compute():
+            var, cvar = self.var_cvar()
+            summary = {}
+            summary['Returns Saat Ini'] = round(self.portfolio.iloc[-1]*100, 3)
+            summary['Returns Annual'] = round((((1+np.mean(self.portfolio))**252)-1)*100, 3)
+            summary['Volatilitas Annual'] = round(np.std(self.portfolio) * np.sqrt(252)*100, 3)
+            summary['Sharpe Ratio'] = round(summary['Returns Annual'] / summary['Volatilitas Annual'], 3)
+            summary['VaR'] = round(var*100, 3)
+            summary['CVaR'] = round(cvar*100, 3)
+            summary['Max Drawdown'] = round(self.drawdown_series()[1].iloc[-1]*100, 3)
+            return summary
+        return self.panel('summary', compute)
+
+@traced('metrics.core_plot_data')
+def core_plot_data(returns, weights, conf  = 95):
+
+    ## Every Panel at Once in the Original Positional Layout, for Callers that Still Want the List
+    analysis = PortfolioAnalysis(returns, weights, conf)
+    return [analysis.summary, analysis.cumulative, analysis.returns, analysis.drawdown, analysis.correlation,
+            analysis.tickers]
+
+def var_cvar_values(returns, conf = 95):
+    
+    ## Historical VaR and CVaR of the Portfolio Column
+    var = round(np.percentile(returns['Portfolio'], 100 - conf), 3)
+    cvar = round(returns['Portfolio'][returns['Portfolio'] <= var].mean(), 3)
+    return var, cvar
+
+def cluster_order(asset_corr):
+    
+    ## Average-Linkage Clustering on the Correlation Distance, Similar Tickers End Up Adjacent
+    from scipy.cluster.hierarchy import linkage, leaves_list
+    from scipy.spatial.distance import squareform
+    corr = np.clip(np.asarray(asset_corr, dtype = float), -1, 1)
+    distance = np.sqrt(0.5*(1 - corr))
+    np.fill_diagonal(distance, 0)
+    return leaves_list(linkage(squareform(distance, checks = False), method = 'average'))
+
+def top_assets(new_ret, num_top = 5):
+    
+    ## Tickers with the Highest Cumulative Return at the Last Date
+    final = new_ret.drop(columns = ['Portfolio'], errors = 'ignore').iloc[-1]
+    return final.sort_values(ascending = False).index[:num_top].tolist()
+
+@traced('metrics.simulate_var_cvar', args = ['method', 'num_paths'])
+def simulate_var_cvar(returns, weights = None, method = 'multivariate', conf = 95, horizon = 1, num_paths = 1000000,
+                      block_size = 5, seed = None, ci = 95, max_elements = 4000000):
+
+    ## Asset Returns and Portfolio Weights, a Single Column is Treated as the Portfolio Itself
+    if isinstance(returns, pd.DataFrame) and 'Portfolio' in returns.columns:
+        returns = returns.drop(columns = ['Portfolio'])
+    values = np.asarray(returns, dtype = float)
+    if values.ndim == 1:
+        values = values[:,None]
+    weights = np.ones(1) if weights is None else np.asarray(weights, dtype = float)
+    num_assets = values.shape[1]
+    rng = np.random.default_rng(seed)
+    
+    ## Per-Method Daily Generator for a Batch of Paths (batch x horizon Portfolio Returns)
+    if method == 'normal':
+        port = values.dot(weights)
+        mean, std = port.mean(), port.std()
+        width = 1
+        def daily(size):
+            return rng.normal(mean, std, (size, horizon))
+    elif method == 'multivariate':
+        moments = portfolio_moments(values)
+        chol = np.linalg.cholesky(moments.cov + 1e-12*np.eye(num_assets)*max(np.mean(np.diag(moments.cov)), 1e-300))
+        width = num_assets
+        def daily(size):
+            shocks = rng.standard_normal((size, horizon, num_assets)).dot(chol.T) + moments.mean
+            return shocks.dot(weights)
+    elif method == 'factor':
+
+        ## Portfolio Shock is Exactly Normal: Factor Part Through L'w, Idiosyncratic Part with Variance sum(d*w^2)
+        moments = factor_moments(values)
+        exposure = moments.cov.loadings.T.dot(weights)
+        specific_std = np.sqrt(moments.cov.specific.dot(weights**2))
+        port_mean = moments.mean.dot(weights)
+        width = len(exposure) + 1
+        def daily(size):
+            factors = rng.standard_normal((size, horizon, len(exposure))).dot(exposure)
+            return factors + specific_std*rng.standard_normal((size, horizon)) + port_mean
+    elif method == 'bootstrap':
+
+        ## Blocks Never Longer than the History, a Short Custom Date Range Resamples Shorter Blocks
+        port = values.dot(weights)
+        if len(port) == 0:
+            raise ValueError('Bootstrap needs at least one day of returns')
+        block_size = max(1, min(block_size, len(port)))
+        num_blocks = -(-horizon // block_size)
+        width = 1
+        def daily(size):
+            starts = rng.integers(0, len(port) - block_size + 1, (size, num_blocks))
+            rows = (starts[:,:,None] + np.arange(block_size)).reshape(size, -1)[:,:horizon]
+            return port[rows]
+    else:
+        raise ValueError('Unknown method {!r}'.format(method))
+
+    ## Memory-Bounded Batches: Only One Float per Path is Kept
+    batch = int(max(1, min(num_paths, max_elements // (horizon*width))))
+    outcome = np.empty(num_paths)
+    for start in range(0, num_paths, batch):
+        size = min(batch, num_paths - start)
+        outcome[start:start+size] = np.prod(1 + daily(size), axis = 1) - 1
+
+    ## VaR with a Distribution-Free Order-Statistic Interval
+    from scipy.stats import norm
+    q = (100 - conf)/100
+    z = norm.ppf(0.5 + ci/200)
+    var = np.percentile(outcome, 100*q)
+    spread = z*np.sqrt(num_paths*q*(1 - q))
+    lo_rank = int(np.clip(np.floor(num_paths*q - spread), 0, num_paths - 1))
+    hi_rank = int(np.clip(np.ceil(num_paths*q + spread), 0, num_paths - 1))
+    ordered = np.partition(outcome, [lo_rank, hi_rank])
+    
+    ## CVaR with a Normal Interval on the Tail Mean
+    tail = outcome[outcome <= var]
+    cvar = tail.mean()
+    cvar_se = tail.std() / np.sqrt(len(tail))
+    return {'VaR': var, 'CVaR': cvar, 'VaR CI': (ordered[lo_rank], ordered[hi_rank]),
+            'CVaR CI': (cvar - z*cvar_se, cvar + z*cvar_se), 'method': method, 'horizon': horizon, 'paths': num_paths}
+
+## Precomputed Mean Vector and Covariance Matrix of Daily Returns
+Moments = namedtuple('Moments', ['mean', 'cov'])
+
+class FactorCov:
+
+    ## Covariance as Loadings Times Their Transpose plus an Idiosyncratic Diagonal
+    ## Products Cost O(n*k) and the n x n Matrix is Never Built, Same dot/diagonal/Indexing as an ndarray
+    def __init__(self, loadings, specific):
+        self.loadings = np.asarray(loadings, dtype = float).reshape(len(specific), -1)
+        self.specific = np.asarray(specific, dtype = float)
+        self.shape = (len(self.specific), len(self.specific))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def dot(self, weights):
+        weights = np.asarray(weights, dtype = float)
+        specific = self.specific if weights.ndim == 1 else self.specific[:,None]
+        return self.loadings.dot(self.loadings.T.dot(weights)) + specific*weights
+
+    def diagonal(self):
+        return np.sum(self.loadings**2, axis = 1) + self.specific
+
+    def __getitem__(self, key):
+
+        ## Dense Sub-Block for a Pair of Index Arrays, e.g. cov[np.ix_(free, free)] in the Active-Set Solver
+        rows, cols = [np.ravel(x) for x in key]
+        block = self.loadings[rows].dot(self.loadings[cols].T)
+        return block + (rows[:,None] == cols[None,:])*self.specific[rows][:,None]
+
+    def toarray(self):
+        index = np.arange(len(self))
+        return self[index, index]
+
+def factor_moments(my_data, num_factors = 10, model = 'pca', seed = 0):
+
+    ## Statistical PCA Factors or One Equal-Weight Market Factor, Same ddof = 0 Convention as portfolio_moments
+    values = np.asarray(my_data, dtype = float)
+    mean = values.mean(axis = 0)
+    centered = (values - mean) / np.sqrt(len(values))
+    variance = np.sum(centered**2, axis = 0)
+    if model == 'pca':
+
+        ## Randomized Range Finder with Power Iterations: O(T*n*k) Instead of a Full SVD or Covariance
+        num_factors = max(1, min(num_factors, *centered.shape))
+        rng = np.random.default_rng(seed)
+        sketch = centered.dot(rng.standard_normal((centered.shape[1], min(num_factors + 10, centered.shape[1]))))
+        for _ in range(2):
+            sketch = centered.dot(centered.T.dot(np.linalg.qr(sketch)[0]))
+        basis = np.linalg.qr(sketch)[0]
+        _, singular, components = np.linalg.svd(basis.T.dot(centered), full_matrices = False)
+        loadings = components[:num_factors].T * singular[:num_factors]
+    elif model == 'market':
+        market = centered.mean(axis = 1)
+        loadings = centered.T.dot(market) / max(np.sqrt(np.sum(market**2)), 1e-300)
+    else:
+        raise ValueError('Unknown factor model {!r}'.format(model))
+
+    ## Idiosyncratic Variance Keeps Each Asset's Own Variance Exact, Floored so the Model Stays Positive Definite
+    loadings = loadings.reshape(len(mean), -1)
+    specific = np.maximum(variance - np.sum(loadings**2, axis = 1), 1e-3*variance + 1e-300)
+    return Moments(mean, FactorCov(loadings, specific))
+
+def portfolio_moments(my_data):
+
+    ## Moments Only Need to be Computed Once per Dataset
+    if isinstance(my_data, Moments):
+        return my_data
+    values = np.asarray(my_data, dtype = float)
+    mean = values.mean(axis = 0)
+    cov = np.atleast_2d(np.cov(values, rowvar = False, ddof = 0))
+    return Moments(mean, cov)
+
+def portfolio_performance(weights, my_data, risk_free = 0, target = 'all'):
+    
+    ## Evaluate Portfolio Performance
+    weights = np.asarray(weights, dtype = float)
+    if isinstance(my_data, Moments):
+        port_mean = my_data.mean.dot(weights)
+        port_var = max(weights.dot(my_data.cov.dot(weights)), 0.0)
+    else:
+        port_return = np.asarray(my_data, dtype = float).dot(weights)
+        port_mean = np.mean(port_return)
+        port_var = np.var(port_return)
+    annual_return = (((1+port_mean)**252)-1)*100
+    annual_vol = np.sqrt(port_var) * np.sqrt(252)*100
+    sharpe_ratio = (annual_return - risk_free)/annual_vol
+    evaluasi = {'Return Annual':annual_return, 'Volatilitas Annual':annual_vol, 'Sharpe Ratio':sharpe_ratio}
+    
+    ## Return Based on Target
+    if target == 'all':
+        return evaluasi
+    if target == 'max_sharpe_ratio':
+        return -sharpe_ratio
+    if target == 'min_volatility':
+        return annual_vol
+
+def batch_performance(weight_matrix, my_data, risk_free = 0):
+
+    ## Annual Return, Volatility and Sharpe Ratio for k Portfolios from the Moments
+    moments = portfolio_moments(my_data)
+    weight_matrix = np.atleast_2d(np.asarray(weight_matrix, dtype = float))
+    port_mean = weight_matrix.dot(moments.mean)
+    port_var = np.maximum(np.sum(weight_matrix * moments.cov.dot(weight_matrix.T).T, axis = 1), 0.0)
+    annual_return = (((1+port_mean)**252)-1)*100
+    annual_vol = np.sqrt(port_var) * np.sqrt(252)*100
+    sharpe_ratio = (annual_return - risk_free)/annual_vol
+    return pd.DataFrame({'Return Annual':annual_return, 'Volatilitas Annual':annual_vol, 'Sharpe Ratio':sharpe_ratio})
+
+@traced('metrics.evaluate_portfolios')
+def evaluate_portfolios(my_data, weight_matrix, risk_free = 0, conf = 95, names = None):
+
+    ## Daily Returns of Every Portfolio in One Matrix Product (days x k)
+    if names is None:
+        names = weight_matrix.index.tolist() if isinstance(weight_matrix, pd.DataFrame) else None
+    weight_matrix = np.atleast_2d(np.asarray(weight_matrix, dtype = float))
+    names = names or ['Portfolio {}'.format(i + 1) for i in range(len(weight_matrix))]
+    port_returns = np.asarray(my_data, dtype = float).dot(weight_matrix.T)
+    wealth = np.cumprod(1 + port_returns, axis = 0)
+
+    ## Annualized Metrics, Same Definitions as portfolio_performance
+    annual_return = (((1+port_returns.mean(axis = 0))**252)-1)*100
+    annual_vol = port_returns.std(axis = 0) * np.sqrt(252)*100
+    sharpe_ratio = (annual_return - risk_free)/annual_vol
+
+    ## Historical VaR, CVaR and Max Drawdown per Column
+    var = np.percentile(port_returns, 100 - conf, axis = 0)
+    tail = port_returns <= var
+    cvar = np.where(tail, port_returns, 0).sum(axis = 0) / np.maximum(tail.sum(axis = 0), 1)
+    drawdown = wealth / np.maximum.accumulate(wealth, axis = 0) - 1
+    max_drawdown = drawdown.min(axis = 0)
+
+    ## Organize Results
+    index = my_data.index if isinstance(my_data, (pd.DataFrame, ReturnsMatrix)) else None
+    summary = pd.DataFrame({'Return Annual':annual_return, 'Volatilitas Annual':annual_vol, 'Sharpe Ratio':sharpe_ratio,
+                            'VaR':var*100, 'CVaR':cvar*100, 'Max Drawdown':max_drawdown*100}, index = names)
+    return {'returns': pd.DataFrame(port_returns, index = index, columns = names),
+            'cumulative': pd.DataFrame(wealth - 1, index = index, columns = names),
+            'summary': summary}
+
+def portfolio_gradient(weights, my_data, risk_free = 0, target = 'all'):
+
+    ## Closed-Form Derivatives of the Annualized Metrics
+    moments = portfolio_moments(my_data)
+    weights = np.asarray(weights, dtype = float)
+    port_mean = moments.mean.dot(weights)
+    cov_weights = moments.cov.dot(weights)
+    port_std = np.sqrt(max(weights.dot(cov_weights), 0.0))
+    annual_return = (((1+port_mean)**252)-1)*100
+    annual_vol = port_std * np.sqrt(252)*100
+    grad_return = 252*((1+port_mean)**251)*100 * moments.mean
+
+    ## Zero Variance is the Volatility's Minimum, so Zero is a Valid Subgradient, the Sharpe Ratio is Undefined There
+    if port_std > 0:
+        grad_vol = cov_weights / port_std * np.sqrt(252)*100
+        grad_sharpe = (grad_return*annual_vol - (annual_return - risk_free)*grad_vol)/annual_vol**2
+    else:
+        grad_vol = np.zeros_like(weights)
+        grad_sharpe = np.zeros_like(weights)
+    gradien = {'Return Annual':grad_return, 'Volatilitas Annual':grad_vol, 'Sharpe Ratio':grad_sharpe}
+    
+    ## Return Based on Target
+    if target == 'all':
+        return gradien
+    if target == 'return':
+        return grad_return
+    if target == 'max_sharpe_ratio':
+        return -grad_sharpe
+    if target == 'min_volatility':
+        return grad_vol
@@ -0,0 +1,436 @@
+## Portfolio Optimization: scipy and Active-Set QP Backends, Efficient Frontier
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize, minimize_scalar, OptimizeResult
+
+from port_engine.telemetry import traced
+
+from port_engine import data
+from port_engine.data import get_market_cap, index_moments
+from port_engine.metrics import (Moments, portfolio_moments, factor_moments, portfolio_performance,
+                                 batch_performance, portfolio_gradient)
+
+def scipy_optimize(moments, target, risk_free_rate = 0, initial = None):
+    
+    ## Set Optimum Weights for Desired Target
+    num_assets = len(moments.mean)
+    args = (moments, risk_free_rate, target)
+    if initial is None:
+        initial = num_assets*[1./num_assets,]
+    constraints = ({'type': 'eq', 'fun': lambda x: np.sum(x) - 1, 'jac': lambda x: np.ones_like(x)})
+    bound = (0.0,1.0)
+    bounds = tuple(bound for asset in range(num_assets))
+    result = minimize(portfolio_performance, x0 = initial, args = args, jac = portfolio_gradient,
+                      bounds=bounds, constraints=constraints)
+    return result
+
+def scipy_efficient_return(moments, expectation, risk_free_rate = 0, initial = None):
+
+    ## Retrieve Returns as Constraint
+    def portfolio_return(weights):
+        return portfolio_performance(weights, moments)['Return Annual']
+
+    ## Optimum Weights Based on Expected Risk
+    target = 'min_volatility'
+    num_assets = len(moments.mean)
+    args = (moments, risk_free_rate, target)
+    if initial is None:
+        initial = num_assets*[1./num_assets,]
+    constraints = ({'type': 'eq', 'fun': lambda x: portfolio_return(x) - expectation,
+                    'jac': lambda x: portfolio_gradient(x, moments, target = 'return')},
+                   {'type': 'eq', 'fun': lambda x: np.sum(x) - 1, 'jac': lambda x: np.ones_like(x)})
+    bounds = tuple((0,1) for asset in range(num_assets))
+    result = minimize(portfolio_performance, x0 = initial, args=args, jac = portfolio_gradient,
+                      bounds=bounds, constraints=constraints)
+    return result
+
+def active_set_qp(cov, eq_matrix, initial, max_iter = None, tol = 1e-10):
+
+    ## Primal Active-Set Method for: min 1/2 x'Cx  s.t.  Ax = b, x >= 0
+    ## The Initial Point Must Already Satisfy Ax = b, Every Step Stays in the Null Space of A
+    num_assets = len(initial)
+    eq_matrix = np.atleast_2d(eq_matrix)
+    ridge = 1e-10 * max(np.mean(cov.diagonal()), 1e-300)
+    x = np.array(initial, dtype = float)
+    working = x <= 0
+    x[working] = 0.0
+    if max_iter is None:
+        max_iter = 10*num_assets + 100
+
+    for nit in range(1, max_iter + 1):
+        
+        ## Equality-Constrained Step on the Free Assets
+        free = ~working
+        grad = cov.dot(x)
+        cov_free = cov[np.ix_(free, free)] + ridge*np.eye(np.sum(free))
+        eq_free = eq_matrix[:, free]
+        num_eq = eq_matrix.shape[0]
+        kkt = np.block([[cov_free, -eq_free.T], [eq_free, np.zeros((num_eq, num_eq))]])
+        rhs = np.concatenate([-grad[free], np.zeros(num_eq)])
+        try:
+            solution = np.linalg.solve(kkt, rhs)
+        except np.linalg.LinAlgError:
+            solution = np.linalg.lstsq(kkt, rhs, rcond = None)[0]
+        step = np.zeros(num_assets)
+        step[free] = solution[:np.sum(free)]
+        multiplier = solution[np.sum(free):]
+
+        if np.max(np.abs(step)) <= tol:
+            
+            ## Release the Bound with the Most Negative Multiplier, or Stop at the Optimum
+            bound_multiplier = grad - eq_matrix.T.dot(multiplier)
+            bound_multiplier[free] = np.inf
+            release = int(np.argmin(bound_multiplier))
+            if bound_multiplier[release] >= -tol:
+                return OptimizeResult(x = x, fun = 0.5*x.dot(cov.dot(x)), success = True, status = 0,
+                                      nit = nit, message = 'Optimization terminated successfully')
+            working[release] = False
+        else:
+
+            ## Move Until the First Free Asset Hits Zero
+            shrinking = free & (step < 0)
+            ratio = np.full(num_assets, np.inf)
+            ratio[shrinking] = -x[shrinking] / step[shrinking]
+            block = int(np.argmin(ratio))
+            alpha = min(1.0, ratio[block])
+            x = x + alpha*step
+            if alpha < 1.0:
+                x[block] = 0.0
+                working[block] = True
+            x = np.maximum(x, 0.0)
+
+    return OptimizeResult(x = x, fun = 0.5*x.dot(cov.dot(x)), success = False, status = 9,
+                          nit = max_iter, message = 'Iteration limit reached')
+
+def qp_vertex_start(cov):
+
+    ## Cold Start at the Lowest Variance Asset: Few Free Assets Keep Each KKT Solve Small on Large Universes
+    start = np.zeros(len(cov))
+    start[int(np.argmin(cov.diagonal()))] = 1.0
+    return start
+
+def qp_feasible_start(mean, daily_target, initial = None):
+
+    ## Blend a Budget-Feasible Guess with the Lowest/Highest Return Asset to Hit the Target
+    num_assets = len(mean)
+    if initial is None:
+        initial = np.full(num_assets, 1./num_assets)
+    initial = np.clip(np.asarray(initial, dtype = float), 0, None)
+    initial = initial / np.sum(initial)
+    start_mean = mean.dot(initial)
+    extreme = int(np.argmax(mean)) if daily_target > start_mean else int(np.argmin(mean))
+    if mean[extreme] == start_mean:
+        return initial
+    share = (daily_target - start_mean) / (mean[extreme] - start_mean)
+    blend = (1 - share)*initial
+    blend[extreme] += share
+    return blend
+
+def qp_optimize(moments, target, risk_free_rate = 0, initial = None):
+    
+    ## Global Minimum Volatility: Budget Constraint Only
+    num_assets = len(moments.mean)
+    ones = np.ones((1, num_assets))
+    if initial is not None:
+        initial = np.clip(np.asarray(initial, dtype = float), 0, None)
+        initial = initial / np.sum(initial)
+    if target == 'min_volatility':
+        start = initial if initial is not None else qp_vertex_start(moments.cov)
+        result = active_set_qp(moments.cov, ones, start)
+        result['fun'] = portfolio_performance(result['x'], moments, risk_free_rate, target)
+        return result
+
+    ## Max Sharpe: min y'Cy s.t. (mean - rf)'y = 1, y >= 0 Gives the Tangency Weights y/sum(y)
+    daily_rf = (1 + risk_free_rate/100)**(1/252) - 1
+    excess = moments.mean - daily_rf
+    gmv = qp_optimize(moments, 'min_volatility', risk_free_rate, initial)
+    nit = gmv['nit']
+    best = gmv['x']
+    if np.max(excess) > 0:
+        
+        ## Start from the Previous Weights When They Earn a Positive Excess Return
+        if initial is not None and excess.dot(initial) > 0:
+            start = initial / excess.dot(initial)
+        else:
+            top = int(np.argmax(excess))
+            start = np.zeros(num_assets)
+            start[top] = 1 / excess[top]
+        tangency = active_set_qp(moments.cov, excess, start)
+        nit += tangency['nit']
+        tangency_x = tangency['x'] / np.sum(tangency['x'])
+        if portfolio_performance(tangency_x, moments, risk_free_rate, target) < portfolio_performance(best, moments, risk_free_rate, target):
+            best = tangency_x
+
+    ## Polish Along the Frontier, since the Annual Return Here Compounds (1+mean)**252
+    def frontier_sharpe(daily_target):
+        ef = qp_frontier_point(moments, daily_target, best)
+        frontier_sharpe.nit += ef['nit']
+        return portfolio_performance(ef['x'], moments, risk_free_rate, target)
+    frontier_sharpe.nit = 0
+    low, high = moments.mean.dot(gmv['x']), np.max(moments.mean)
+    if high > low:
+        search = minimize_scalar(frontier_sharpe, bounds = (low, high), method = 'bounded',
+                                 options = {'xatol': 1e-12*max(abs(high), 1e-12)})
+        polished = qp_frontier_point(moments, search['x'], best)['x']
+        if portfolio_performance(polished, moments, risk_free_rate, target) < portfolio_performance(best, moments, risk_free_rate, target):
+            best = polished
+        nit += frontier_sharpe.nit
+    return OptimizeResult(x = best, fun = portfolio_performance(best, moments, risk_free_rate, target),
+                          success = True, status = 0, nit = nit, message = 'Optimization terminated successfully')
+
+def qp_frontier_point(moments, daily_target, initial = None):
+
+    ## Minimum Variance for a Daily Mean Target, Infeasible Targets Return the Closest Extreme Asset
+    mean = moments.mean
+    num_assets = len(mean)
+    if daily_target > np.max(mean) or daily_target < np.min(mean):
+        x = np.zeros(num_assets)
+        x[int(np.argmax(mean)) if daily_target > np.max(mean) else int(np.argmin(mean))] = 1.0
+        return OptimizeResult(x = x, fun = 0.5*x.dot(moments.cov.dot(x)), success = False, status = 8,
+                              nit = 0, message = 'Target return is outside the attainable range')
+    eq_matrix = np.vstack([np.ones(num_assets), mean])
+    if initial is None:
+        initial = qp_vertex_start(moments.cov)
+    start = qp_feasible_start(mean, daily_target, initial)
+    return active_set_qp(moments.cov, eq_matrix, start)
+
+def qp_efficient_return(moments, expectation, risk_free_rate = 0, initial = None):
+
+    ## The Annual Target Maps to a Linear Constraint on the Daily Mean
+    daily_target = (1 + expectation/100)**(1/252) - 1
+    result = qp_frontier_point(moments, daily_target, initial)
+    result['fun'] = portfolio_performance(result['x'], moments, risk_free_rate, 'min_volatility')
+    return result
+
+## Solver Backends Selectable per Call, 'scipy' is the Reference Implementation
+SOLVERS = {'scipy': {'optimize': scipy_optimize, 'efficient_return': scipy_efficient_return},
+           'qp': {'optimize': qp_optimize, 'efficient_return': qp_efficient_return}}
+
+def get_solver(solver):
+    if solver not in SOLVERS:
+        raise ValueError('Unknown solver {!r}, choose from {}'.format(solver, list(SOLVERS)))
+    return SOLVERS[solver]
+
+@traced('optimize', args = ['target', 'solver'], result = ['nit', 'nfev'])
+def optimize(my_data, target, risk_free_rate = 0, solver = 'scipy', initial = None):
+    return get_solver(solver)['optimize'](portfolio_moments(my_data), target, risk_free_rate, initial)
+
+@traced('efficient_return', args = ['solver'], result = ['nit', 'nfev'])
+def efficient_return(my_data, expectation, risk_free_rate = 0, initial = None, solver = 'scipy'):
+    return get_solver(solver)['efficient_return'](portfolio_moments(my_data), expectation, risk_free_rate, initial)
+
+@traced('efficient_frontier', args = ['solver', 'warm_start'])
+def efficient_frontier(my_data, expectation_range, risk_free_rate = 0, warm_start = False, solver = 'scipy',
+                       workers = 1):
+    moments = portfolio_moments(my_data)
+    if workers != 1 and len(expectation_range) > 1:
+        return parallel_frontier(moments, expectation_range, risk_free_rate, warm_start, solver, workers)
+    if not warm_start:
+        efficients = []
+        for exp in expectation_range:
+            efficients.append(efficient_return(moments, exp, risk_free_rate, solver = solver))
+        return efficients
+
+    ## Sweep Targets in Ascending Order, Seeding Each Solve from the Previous Feasible Weights
+    ## Frontier Weights Move Linearly in the Target While the Active Set Holds, so Extrapolate
+    efficients = [None]*len(expectation_range)
+    solved = []
+    for i in np.argsort(expectation_range, kind = 'stable'):
+        initial = None
+        if len(solved) > 0:
+            initial = solved[-1][1]
+        if len(solved) > 1:
+            (exp_a, x_a), (exp_b, x_b) = solved[-2], solved[-1]
+            if exp_b != exp_a:
+                initial = x_b + (x_b - x_a) * (expectation_range[i] - exp_b) / (exp_b - exp_a)
+                initial = np.clip(initial, 0, 1)
+                initial = initial / np.sum(initial)
+        efficients[i] = efficient_return(moments, expectation_range[i], risk_free_rate, initial, solver)
+        if efficients[i]['success']:
+            solved.append((expectation_range[i], efficients[i]['x']))
+    return efficients
+
+## Moments Attached from Shared Memory Inside Each Frontier Worker Process
+worker_state = {}
+
+def frontier_worker_init(shm_name, num_assets):
+
+    ## Map the Parent's Mean Vector and Covariance Matrix without Copying
+    shm = shared_memory.SharedMemory(name = shm_name)
+    buffer = np.ndarray((num_assets + num_assets*num_assets,), dtype = np.float64, buffer = shm.buf)
+    worker_state['shm'] = shm
+    worker_state['moments'] = Moments(buffer[:num_assets], buffer[num_assets:].reshape(num_assets, num_assets))
+
+def frontier_worker_solve(expectation_range, risk_free_rate, warm_start, solver):
+    return efficient_frontier(worker_state['moments'], expectation_range, risk_free_rate, warm_start, solver)
+
+def parallel_frontier(my_data, expectation_range, risk_free_rate = 0, warm_start = False, solver = 'scipy',
+                      workers = None):
+    moments = portfolio_moments(my_data)
+    num_assets = len(moments.mean)
+    num_points = len(expectation_range)
+    workers = min(workers or os.cpu_count() or 1, num_points)
+    
+    ## Factor Covariances are Cheap Enough to Solve Serially and are Not a Flat Buffer to Share
+    if workers <= 1 or not isinstance(moments.cov, np.ndarray):
+        return efficient_frontier(moments, expectation_range, risk_free_rate, warm_start, solver)
+
+    ## Contiguous Blocks of Sorted Targets Keep the Warm Start Useful Inside Each Worker
+    order = np.argsort(expectation_range, kind = 'stable')
+    chunks = [chunk for chunk in np.array_split(order, workers) if len(chunk) > 0]
+    efficients = [None]*num_points
+    shm = None
+    try:
+        
+        ## Publish the Moments Once, Tasks Only Carry Their Target Returns
+        shm = shared_memory.SharedMemory(create = True, size = 8*(num_assets + num_assets*num_assets))
+        buffer = np.ndarray((num_assets + num_assets*num_assets,), dtype = np.float64, buffer = shm.buf)
+        buffer[:num_assets] = moments.mean
+        buffer[num_assets:] = moments.cov.ravel()
+        with ProcessPoolExecutor(max_workers = len(chunks), initializer = frontier_worker_init,
+                                 initargs = (shm.name, num_assets)) as pool:
+            futures = [pool.submit(frontier_worker_solve, [expectation_range[i] for i in chunk],
+                                   risk_free_rate, warm_start, solver) for chunk in chunks]
+            
+            ## Collect in Submission Order so the Output Matches expectation_range
+            for chunk, future in zip(chunks, futures):
+                for i, result in zip(chunk, future.result()):
+                    efficients[i] = result
+    except (OSError, NotImplementedError, BrokenProcessPool):
+        
+        ## Serial Fallback When Processes or Shared Memory are Unavailable
+        return efficient_frontier(moments, expectation_range, risk_free_rate, warm_start, solver)
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+    return efficients
+
+@traced('adaptive_frontier', args = ['solver'])
+def adaptive_frontier(my_data, min_exp, max_exp, num_points = 50, coarse_points = 10, risk_free_rate = 0,
+                      solver = 'scipy'):
+    moments = portfolio_moments(my_data)
+
+    ## Coarse Warm-Started Pass over the Whole Range
+    targets = list(np.linspace(min_exp, max_exp, min(coarse_points, num_points)))
+    efficients = efficient_frontier(moments, targets, risk_free_rate, warm_start = True, solver = solver)
+    
+    ## Refine Where the Frontier Bends the Most
+    while len(targets) < num_points:
+        points = np.array([[portfolio_performance(x['x'], moments)['Volatilitas Annual'], t]
+                           for x, t in zip(efficients, targets)])
+        points = points / np.maximum(np.ptp(points, axis = 0), 1e-12)
+        segment = np.diff(points, axis = 0)
+        length = np.hypot(segment[:,0], segment[:,1])
+        heading = np.arctan2(segment[:,1], segment[:,0])
+        turn = np.abs(np.diff(heading))
+        bend = np.zeros(len(segment))
+        bend[:-1] += turn
+        bend[1:] += turn
+        score = length * (bend + 1e-3)
+        success = np.array([x['success'] for x in efficients])
+        score[~(success[:-1] & success[1:])] = 0
+        if np.max(score) <= 0:
+            break
+        i = int(np.argmax(score))
+
+        ## Seed the New Point from Its Neighbours
+        initial = (efficients[i]['x'] + efficients[i+1]['x']) / 2
+        initial = initial / np.sum(initial)
+        exp = (targets[i] + targets[i+1]) / 2
+        targets.insert(i+1, exp)
+        efficients.insert(i+1, efficient_return(moments, exp, risk_free_rate, initial, solver))
+    return efficients
+
+def frontier_iterations(efficients):
+
+    ## Solver Iterations per Frontier Point, in the Same Order as the Targets
+    return np.array([int(x.get('nit', 0)) for x in efficients])
+
+def frontier_table(efficients, moments, tickers, risk_free_rate = 0):
+
+    ## Same Layout as the Efficient Frontier Table in markowitz_portfolio
+    ef_weight = np.array([x['x'] for x in efficients])
+    ef_result = batch_performance(ef_weight, moments, risk_free_rate)
+    ef_port = pd.concat([ef_result, pd.DataFrame(ef_weight, columns = [x for x in tickers])], axis = 1)
+    ef_port = round(ef_port, 3)
+    return ef_port
+
+@traced('markowitz_portfolio', args = ['solver', 'frontier', 'risk_model'])
+def markowitz_portfolio(my_data, max_exp, rf = 0, frontier = 'cold', solver = 'scipy', workers = 1,
+                        lookback = None, stats_version = None, risk_model = 'sample'):
+
+    ## Individual Assets Performance, from the Statistics Index When a Lookback is Chosen
+    ## stats_version Only Keys the Cache, so a Nightly Rebuild Invalidates Cached Results
+    ticker = [x for x in my_data.columns]
+    moments = index_moments(ticker, lookback) if lookback is not None else None
+    if moments is not None:
+        ind_stocks = data.stats_index.ticker_stats(ticker, lookback).to_dict('index')
+    else:
+        values = np.asarray(my_data, dtype = float)
+        annual_stock_return = np.round((((1+values.mean(axis = 0))**252)-1)*100, 3)
+        annual_stock_vol = np.round(values.std(axis = 0) * np.sqrt(252)*100, 3)
+        ind_stocks = {}
+        for each, ret, vol in zip(ticker, annual_stock_return, annual_stock_vol):
+            ind_stocks[each] = {'Return Annual':ret, 'Volatilitas Annual':vol}
+        
+        ## Low-Rank Factor Covariance Keeps Large Universes at O(n*k) per Variance and Gradient
+        moments = factor_moments(my_data) if risk_model == 'factor' else portfolio_moments(my_data)
+
+    ## Equal Weight Portfolio
+    num_assets = len(my_data.columns)
+    ew_weights = num_assets*[1./num_assets,]
+    ew = portfolio_performance(ew_weights, moments, rf)
+    for key, value in ew.items():
+        ew[key] = round(value, 3)
+    for i in range(0, num_assets):
+        ew[ticker[i]] = ew_weights[i]
+    
+    ## Market Cap Weight Portfolio
+    mcap_weights = get_market_cap(ticker)
+    mcap = portfolio_performance(mcap_weights, moments, rf)
+    for key, value in mcap.items():
+        mcap[key] = round(value, 3)
+    for i in range(0, num_assets):
+        mcap[ticker[i]] = mcap_weights[i]
+        
+    ## MSR Portfolio
+    msr_obj = optimize(my_data = moments, target = 'max_sharpe_ratio', risk_free_rate = rf, solver = solver)
+    msr = portfolio_performance(msr_obj['x'], moments, rf)
+    for key, value in msr.items():
+        msr[key] = round(value, 3)
+    msr_weights = [round(x, 3) for x in msr_obj['x']]
+    for i in range(0, num_assets):
+        msr[ticker[i]] = msr_weights[i]
+    
+    ## GMV Portfolio
+    gmv_obj = optimize(my_data = moments, target = 'min_volatility', risk_free_rate = rf, solver = solver)
+    gmv = portfolio_performance(gmv_obj['x'], moments, rf)
+    for key, value in gmv.items():
+        gmv[key] = round(value, 3)
+    gmv_weights = [round(x, 3) for x in gmv_obj['x']]
+    for i in range(0, num_assets):
+        gmv[ticker[i]] = gmv_weights[i]
+    
+    ## Efficient Frontier Portfolio
+    min_exp = gmv['Return Annual']
+    max_exp = max_exp + 5
+    if frontier == 'adaptive':
+        ef = adaptive_frontier(moments, min_exp, max_exp, 50, risk_free_rate = rf, solver = solver)
+    else:
+        range_exp = np.linspace(min_exp, max_exp, 50)
+        ef = efficient_frontier(moments, range_exp, rf, warm_start = (frontier == 'warm'), solver = solver,
+                                workers = workers)
+    
+    ## Organize Portfolio Results
+    key_port = round(pd.DataFrame([ew, mcap, msr, gmv]), 3)
+    key_port.index = ['Equal Weight', 'Market Cap', 'Max Sharpe Ratio', 'Global Min Volatility']
+    
+    ef_port = frontier_table(ef, moments, ticker, rf)
+    
+    return [ind_stocks, key_port, ef_port]
@@ -0,0 +1,216 @@
+## Local Price Store: One Memory-Mapped NumPy Record File per Ticker
+import os
+import json
+import datetime
+import tempfile
+import contextlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+from port_engine import telemetry
+
+FIELDS = ['Adj Close', 'Volume']
+DEFAULT_ROOT = os.environ.get('PRICE_STORE_DIR',
+                              os.path.join(os.path.expanduser('~'), '.cache', 'portfolio-analysis', 'prices'))
+
+## IDX Closes at 16:00 WIB, Today's Bar is Only Stored Once the Session is Over
+EXCHANGE_TZ = 'Asia/Jakarta'
+SESSION_CLOSE = datetime.time(16, 15)
+
+## Relative Change of a Stored Adjusted Close that Means Yahoo Re-Adjusted the History
+REBASE_TOLERANCE = 1e-4
+
+## Dates and Values Live in One Record Array, so a Reader Never Sees Halves of Two Writes
+RECORD = np.dtype([('date', 'datetime64[D]'), ('values', np.float64, (len(FIELDS),))])
+
+def yahoo_fetcher(tickers, start_date, end_date):
+
+    ## Single Download for All Tickers Sharing the Same Missing Range
+    import yfinance as yf
+    adj_ticker = [x + '.JK' for x in tickers]
+    prices = yf.download(adj_ticker, start = start_date, end = end_date, group_by = 'ticker', progress = False)
+    result = {}
+    for ticker, adj in zip(tickers, adj_ticker):
+        frame = prices[adj] if isinstance(prices.columns, pd.MultiIndex) else prices
+        result[ticker] = frame[FIELDS].dropna(how = 'all')
+    return result
+
+class PriceStore:
+
+    def __init__(self, root = DEFAULT_ROOT, fetcher = yahoo_fetcher, now = None):
+        self.root = root
+        self.fetcher = fetcher
+        self.now = now or (lambda: pd.Timestamp.now(tz = EXCHANGE_TZ))
+
+    def path(self, ticker, part):
+        return os.path.join(self.root, '{}.{}'.format(ticker, part))
+
+    def session_end(self):
+
+        ## End (Exclusive) of the Last Completed Session, a Partial Intraday Bar is Never Covered
+        now = pd.Timestamp(self.now())
+        if now.time() >= SESSION_CLOSE:
+            return now.date() + datetime.timedelta(1)
+        return now.date()
+
+    def coverage(self, ticker):
+
+        ## Date Range Already Requested from the Fetcher, End Exclusive
+        if not os.path.exists(self.path(ticker, 'npy')):
+            return None
+        try:
+            with open(self.path(ticker, 'json')) as f:
+                meta = json.load(f)
+            return datetime.date.fromisoformat(meta['start']), datetime.date.fromisoformat(meta['end'])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def load(self, ticker):
+
+        ## Memory-Mapped Views, Nothing is Read Until Sliced
+        try:
+            records = np.load(self.path(ticker, 'npy'), mmap_mode = 'r')
+        except (OSError, ValueError):
+            return np.empty(0, dtype = 'datetime64[D]'), np.empty((0, len(FIELDS)))
+        return records['date'], records['values']
+
+    @contextlib.contextmanager
+    def locked(self, ticker):
+
+        ## Exclusive per-Ticker Lock Around Read-Merge-Write, Shared by Threads and Worker Processes
+        os.makedirs(self.root, exist_ok = True)
+        with open(self.path(ticker, 'lock'), 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def replace(self, ticker, part, content):
+
+        ## Unique Temporary File in the Same Directory, then an Atomic Rename over the Old One
+        fd, tmp = tempfile.mkstemp(prefix = '{}.{}.'.format(ticker, part), suffix = '.tmp', dir = self.root)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                content(f)
+            os.replace(tmp, self.path(ticker, part))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    @staticmethod
+    def rebased(stored, frame):
+
+        ## Splits and Dividends Back-Adjust the Whole History, the Overlapping Bars Show Whether That Happened
+        common = stored.index.intersection(frame.index)
+        old = stored.loc[common, 'Adj Close'].values
+        new = frame.loc[common, 'Adj Close'].values
+        valid = ~(np.isnan(old) | np.isnan(new))
+        return not np.allclose(new[valid], old[valid], rtol = REBASE_TOLERANCE, atol = 0)
+
+    def save(self, ticker, frame, start_date, end_date, replace = False):
+
+        ## Merge New Rows over Stored Rows, False Without Writing When They are on Another Adjustment Basis
+        frame = frame[FIELDS].astype(float)
+        frame.index = pd.DatetimeIndex(frame.index).tz_localize(None).normalize()
+        frame = frame[(frame.index >= pd.Timestamp(start_date)) & (frame.index < pd.Timestamp(end_date))]
+        with self.locked(ticker):
+            covered = None if replace else self.coverage(ticker)
+            if covered is None:
+                merged = frame.sort_index()
+            else:
+                dates, values = self.load(ticker)
+                stored = pd.DataFrame(np.array(values), index = pd.DatetimeIndex(np.array(dates)), columns = FIELDS)
+                if self.rebased(stored, frame):
+                    return False
+                stored = stored[~stored.index.isin(frame.index)]
+                merged = pd.concat([stored, frame]).sort_index()
+            records = np.empty(len(merged), dtype = RECORD)
+            records['date'] = merged.index.values.astype('datetime64[D]')
+            records['values'] = merged.values
+            self.replace(ticker, 'npy', lambda f: np.save(f, records))
+
+            ## Extend Coverage Only After the Data is on Disk
+            if covered is not None:
+                start_date, end_date = min(start_date, covered[0]), max(end_date, covered[1])
+            meta = json.dumps({'start': start_date.isoformat(), 'end': end_date.isoformat()})
+            self.replace(ticker, 'json', lambda f: f.write(meta.encode()))
+        return True
+
+    def missing_ranges(self, ticker, start_date, end_date):
+
+        ## Each Range Reaches One Stored Bar into the Existing History, the Overlap Used by rebased
+        covered = self.coverage(ticker)
+        if covered is None:
+            return [(start_date, end_date)]
+        dates, _ = self.load(ticker)
+        first, last = covered
+        if len(dates) > 0:
+            first, last = pd.Timestamp(dates[0]).date(), pd.Timestamp(dates[-1]).date()
+        ranges = []
+        if start_date < covered[0]:
+            ranges.append((start_date, max(covered[0], first + datetime.timedelta(1))))
+        if end_date > covered[1]:
+            ranges.append((min(covered[1], last), end_date))
+        return ranges
+
+    def fetch(self, tickers, start_date, end_date):
+        with telemetry.span('price_store.fetch', tickers = len(tickers), start = str(start_date), end = str(end_date)):
+            return self.fetcher(tickers, start_date, end_date)
+
+    def update(self, tickers, start_date, end_date = None):
+
+        ## Group Tickers by Missing Range so Each Range is One Fetcher Call, Never Past the Last Completed Session
+        ## Returns {ticker: reason} for the Fetches that Failed in this Call, Their Ranges Stay Uncovered
+        start_date = pd.Timestamp(start_date).date()
+        end_date = min(pd.Timestamp(end_date).date(), self.session_end()) if end_date is not None else self.session_end()
+        requests = {}
+        for ticker in tickers:
+            for missing in self.missing_ranges(ticker, start_date, end_date):
+                requests.setdefault(missing, []).append(ticker)
+        rebased, failed = {}, {}
+        for (start, end), group in requests.items():
+            fetched = self.fetch(group, start, end)
+            failed.update(getattr(fetched, 'failed', {}))
+            for ticker in group:
+                frame = fetched.get(ticker)
+                if frame is not None and len(frame) > 0 and not self.save(ticker, frame, start, end):
+                    rebased[ticker] = (min(start_date, self.coverage(ticker)[0]), end_date)
+
+        ## Adjustment Basis Changed: Refetch the Whole Covered History and Replace the Stored Rows
+        refetch = {}
+        for ticker, missing in rebased.items():
+            refetch.setdefault(missing, []).append(ticker)
+        for (start, end), group in refetch.items():
+            fetched = self.fetch(group, start, end)
+            failed.update(getattr(fetched, 'failed', {}))
+            for ticker in group:
+                frame = fetched.get(ticker)
+                if frame is not None and len(frame) > 0:
+                    self.save(ticker, frame, start, end, replace = True)
+        return failed
+
+    def prices(self, tickers, start_date, end_date = None, update = True):
+
+        ## Serve Any Ticker Subset and Start Date by Slicing the Stored Columns
+        if update:
+            self.update(tickers, start_date, end_date)
+        start = np.datetime64(pd.Timestamp(start_date).date(), 'D')
+        end = np.datetime64(pd.Timestamp(end_date).date(), 'D') if end_date is not None else None
+        columns = {}
+        for ticker in tickers:
+            dates, values = self.load(ticker)
+            lo = np.searchsorted(dates, start, side = 'left')
+            hi = np.searchsorted(dates, end, side = 'left') if end is not None else len(dates)
+            index = pd.DatetimeIndex(np.array(dates[lo:hi]), name = 'Date')
+            for i, field in enumerate(FIELDS):
+                columns[(field, ticker)] = pd.Series(np.array(values[lo:hi, i]), index = index)
+        prices = pd.DataFrame(columns)
+        prices.columns = pd.MultiIndex.from_tuples(prices.columns)
+        prices.index.name = 'Date'
+        return prices
@@ -0,0 +1,73 @@
+## Returns Container: One Contiguous Read-Only Array (Dates x Tickers) plus its Date Index and Tickers
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+class ReturnsMatrix:
+
+    ## Never Mutated After Construction, so Caches Can Share it and Metrics Get Views Instead of Copies
+    def __init__(self, values, index, columns, dtype = np.float64):
+        values = np.ascontiguousarray(values, dtype = dtype)
+        if values.flags.writeable:
+            values = values.copy()
+            values.setflags(write = False)
+        self.values = values
+        self.index = pd.DatetimeIndex(index)
+        self.columns = pd.Index(columns)
+        self.dtype = values.dtype
+        self.shape = values.shape
+        self.key = None
+
+    @classmethod
+    def from_frame(cls, frame, dtype = np.float64):
+        return cls(frame.values, frame.index, frame.columns, dtype)
+
+    def __array__(self, dtype = None):
+        if dtype is None or np.dtype(dtype) == self.dtype:
+            return self.values
+        return self.values.astype(dtype)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def cache_key(self):
+
+        ## Content Hash Computed Once, Used by st.cache and the Result Cache Instead of Re-Hashing the Values
+        if self.key is None:
+            digest = hashlib.blake2b(self.values.tobytes(), digest_size = 16).hexdigest()
+            dates = [str(self.index[0]), str(self.index[-1])] if len(self) > 0 else []
+            self.key = (tuple(str(x) for x in self.columns), *dates, len(self), str(self.dtype), digest)
+        return self.key
+
+    def rows(self, start = None, stop = None):
+
+        ## Contiguous Date Range as a Zero-Copy View
+        return ReturnsMatrix(self.values[start:stop], self.index[start:stop], self.columns, self.dtype)
+
+    def after(self, date):
+        return self.rows(self.index.searchsorted(date, side = 'right'))
+
+    def select(self, tickers):
+        position = self.columns.get_indexer(tickers)
+        if np.any(position < 0):
+            raise KeyError([x for x, i in zip(tickers, position) if i < 0])
+        values = self.values[:, position]
+        values.setflags(write = False)
+        return ReturnsMatrix(values, self.index, tickers, self.dtype)
+
+    def portfolio(self, weights):
+        return self.values.dot(np.asarray(weights, dtype = float))
+
+    def to_frame(self):
+
+        ## Display Edge: a Fresh, Writable DataFrame the Caller is Free to Modify
+        return pd.DataFrame(np.array(self.values, dtype = float), index = self.index.copy(), columns = list(self.columns))
+
+def as_returns(my_data, dtype = None):
+
+    ## DataFrames from Batch Jobs or Benchmarks are Wrapped Once, a 'Portfolio' Column is Not an Asset
+    if isinstance(my_data, ReturnsMatrix):
+        return my_data
+    frame = my_data.drop(columns = ['Portfolio'], errors = 'ignore')
+    return ReturnsMatrix.from_frame(frame, dtype or np.float64)
@@ -0,0 +1,114 @@
+## Rolling Analytics: Prefix Sums Built Once, Every Window Length is Then O(T) Differences
+import itertools
+
+import numpy as np
+import pandas as pd
+
+class RollingEngine:
+
+    ## Centered Prefix Sums of Returns, Squares and Benchmark Cross Products for All Assets at Once
+    ## Results are Memoized per (Metric, Window), so a Slider Change is a Lookup After the First Visit
+    def __init__(self, returns, benchmark = None):
+        self.index = returns.index
+        self.columns = list(returns.columns)
+        self.values = np.asarray(returns, dtype = float)
+        self.center = self.values.mean(axis = 0)
+        centered = self.values - self.center
+        self.sum1 = self.prefix(centered)
+        self.sum2 = self.prefix(centered**2)
+        self.benchmark = None
+        if benchmark is not None:
+            benchmark = np.asarray(benchmark, dtype = float)
+            benchmark = benchmark - benchmark.mean()
+            self.benchmark = (self.prefix(benchmark), self.prefix(benchmark**2), self.prefix(centered*benchmark[:,None]))
+        self.pair_sums = {}
+        self.results = {}
+
+    @staticmethod
+    def prefix(values):
+        return np.concatenate([np.zeros((1,) + values.shape[1:]), np.cumsum(values, axis = 0)])
+
+    @staticmethod
+    def diff(prefix, window):
+        return prefix[window:] - prefix[:-window]
+
+    def memo(self, key, compute):
+        if key not in self.results:
+            self.results[key] = compute()
+        return self.results[key]
+
+    def frame(self, values, window, columns = None):
+        return pd.DataFrame(values, index = self.index[window - 1:], columns = columns or self.columns)
+
+    def moments(self, window):
+
+        ## Window Mean and Sample Variance (ddof = 1, Same as pandas rolling().std())
+        def compute():
+            sum1, sum2 = self.diff(self.sum1, window), self.diff(self.sum2, window)
+            mean = self.center + sum1/window
+            variance = np.maximum(sum2 - sum1**2/window, 0.0)/(window - 1)
+            return mean, variance
+        return self.memo(('moments', window), compute)
+
+    def volatility(self, window):
+
+        ## Annualized Rolling Volatility as a Fraction, Same Scale as the Previous rolling_volatility Plot
+        return self.memo(('volatility', window),
+                         lambda: self.frame(np.sqrt(self.moments(window)[1]) * np.sqrt(252), window))
+
+    def sharpe(self, window, risk_free = 0):
+        def compute():
+            mean, variance = self.moments(window)
+            annual_return = (((1+mean)**252)-1)*100
+            annual_vol = np.sqrt(variance) * np.sqrt(252)*100
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                sharpe_ratio = (annual_return - risk_free)/annual_vol
+            return self.frame(sharpe_ratio, window)
+        return self.memo(('sharpe', window, risk_free), compute)
+
+    def beta(self, window):
+
+        ## Covariance with the Benchmark over its Variance, Both from Prefix Sums
+        if self.benchmark is None:
+            raise ValueError('RollingEngine was built without a benchmark')
+        def compute():
+            bench1, bench2, cross = [self.diff(x, window) for x in self.benchmark]
+            sum1 = self.diff(self.sum1, window)
+            covariance = cross - sum1*bench1[:,None]/window
+            variance = np.maximum(bench2 - bench1**2/window, 0.0)
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                return self.frame(covariance / variance[:,None], window)
+        return self.memo(('beta', window), compute)
+
+    def correlation(self, window, pairs = None):
+
+        ## Pairwise Rolling Correlation, Cross-Product Prefix Sums are Built Once per Requested Pair Set
+        pairs = tuple(pairs) if pairs is not None else tuple(itertools.combinations(self.columns, 2))
+        first = [self.columns.index(a) for a, _ in pairs]
+        second = [self.columns.index(b) for _, b in pairs]
+        def compute():
+            if pairs not in self.pair_sums:
+                centered = self.values - self.center
+                self.pair_sums[pairs] = self.prefix(centered[:, first]*centered[:, second])
+            sum1 = self.diff(self.sum1, window)
+            variance = np.maximum(self.diff(self.sum2, window) - sum1**2/window, 0.0)
+            covariance = self.diff(self.pair_sums[pairs], window) - sum1[:, first]*sum1[:, second]/window
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                correlation = covariance / np.sqrt(variance[:, first]*variance[:, second])
+            return self.frame(np.clip(correlation, -1, 1), window, ['{} - {}'.format(a, b) for a, b in pairs])
+        return self.memo(('correlation', window, pairs), compute)
+
+    def drawdown(self, window):
+
+        ## Drawdown from the Highest Close of the Trailing Window, O(T) Running Maximum per Window
+        from scipy.ndimage import maximum_filter1d
+        def compute():
+            wealth = np.cumprod(1 + self.values, axis = 0)
+            peak = maximum_filter1d(wealth, size = window, axis = 0, origin = (window - 1)//2)
+            return self.frame((wealth / peak - 1)[window - 1:], window)
+        return self.memo(('drawdown', window), compute)
+
+    def table(self, metric, windows, column):
+
+        ## One Column Across Many Window Lengths, e.g. the Volatility Term Structure of the Portfolio
+        return pd.DataFrame({window: getattr(self, metric)(window)[column] for window in windows})
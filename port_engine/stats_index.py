@@ -0,0 +1,178 @@
+## Cross-Sectional Statistics Index: Nightly Per-Ticker Moments and Full Covariance, Memory-Mapped
+import os
+import sys
+import json
+import time
+import shutil
+import datetime
+
+import numpy as np
+import pandas as pd
+
+LOOKBACKS = {'3M': 63, '6M': 126, '1Y': 252, '3Y': 756, '5Y': 1260}
+MIN_COVERAGE = 0.9
+DEFAULT_ROOT = os.environ.get('STATS_INDEX_DIR',
+                              os.path.join(os.path.expanduser('~'), '.cache', 'portfolio-analysis', 'stats'))
+
+def pairwise_moments(returns):
+
+    ## NaN-Aware Mean and Pairwise-Complete Population Covariance, All Pairs in a Few Matrix Products
+    values = np.asarray(returns, dtype = float)
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0.0)
+    mask = present.astype(float)
+    count = present.sum(axis = 0)
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        mean = filled.sum(axis = 0) / count
+        pair_count = mask.T.dot(mask)
+        pair_sum = filled.T.dot(mask)
+        cross = filled.T.dot(filled)
+        cov = (cross - pair_sum*pair_sum.T/pair_count) / pair_count
+    return mean, cov, count
+
+def nearest_psd(cov):
+
+    ## Pairwise-Complete Covariances Can Have Negative Eigenvalues: Clip Them, then Rescale to the Original Variances
+    cov = (cov + cov.T) / 2
+    eigenvalues, eigenvectors = np.linalg.eigh(cov)
+    if eigenvalues[0] >= 0:
+        return cov
+    clipped = (eigenvectors * np.maximum(eigenvalues, 0)).dot(eigenvectors.T)
+    scale = np.sqrt(np.diag(cov) / np.maximum(np.diag(clipped), 1e-300))
+    return clipped * np.outer(scale, scale)
+
+def build_index(prices, lookbacks = LOOKBACKS, root = DEFAULT_ROOT, as_of = None, keep = 2):
+
+    ## Daily Returns for the Whole Universe, Late Listings Stay NaN Before Their First Price
+    returns = prices.pct_change(fill_method = None).iloc[1:]
+    if as_of is not None:
+        returns = returns.loc[:pd.Timestamp(as_of)]
+    tickers = [x for x in returns.columns]
+    as_of = returns.index[-1].date()
+
+    ## Write a Complete Build Directory First, Readers Keep Using the Previous One
+    build = 'build-{}-{}'.format(as_of.isoformat(), int(time.time()*1e3))
+    os.makedirs(os.path.join(root, build))
+    windows = {}
+    for key, length in lookbacks.items():
+        mean, cov, count = pairwise_moments(returns.iloc[-length:])
+        rows = int(min(length, len(returns)))
+
+        ## Only Tickers the Index Will Serve Need a PSD Block, Sparser Ones Can Have Pairs with No Overlap at All
+        served = np.flatnonzero(count >= MIN_COVERAGE*rows)
+        if len(served) > 0:
+            cov[np.ix_(served, served)] = nearest_psd(cov[np.ix_(served, served)])
+        stats = np.column_stack([mean, np.sqrt(np.diag(cov)), count])
+        np.save(os.path.join(root, build, 'cov-{}.npy'.format(key)), cov)
+        np.save(os.path.join(root, build, 'stats-{}.npy'.format(key)), stats)
+        windows[key] = {'length': length, 'rows': rows}
+    manifest = {'as_of': as_of.isoformat(), 'tickers': tickers, 'lookbacks': windows, 'built_at': time.time()}
+    with open(os.path.join(root, build, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+
+    ## Swap the Pointer Atomically, then Remove Old Builds
+    tmp = os.path.join(root, 'CURRENT.tmp')
+    with open(tmp, 'w') as f:
+        f.write(build)
+    os.replace(tmp, os.path.join(root, 'CURRENT'))
+    builds = sorted(x for x in os.listdir(root) if x.startswith('build-'))
+    for old in builds[:-keep]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors = True)
+    return build
+
+class StatsIndex:
+
+    def __init__(self, root = DEFAULT_ROOT):
+        self.root = root
+        self.version = None
+        self.manifest = None
+        self.position = {}
+        self.arrays = {}
+
+    def load(self):
+
+        ## Re-Read Only When the Nightly Job Has Swapped in a New Build
+        try:
+            with open(os.path.join(self.root, 'CURRENT')) as f:
+                build = f.read().strip()
+        except OSError:
+            return False
+        if build == self.version:
+            return True
+        try:
+            with open(os.path.join(self.root, build, 'manifest.json')) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return self.version is not None
+        self.manifest = manifest
+        self.position = {x: i for i, x in enumerate(manifest['tickers'])}
+        self.arrays = {}
+        self.version = build
+        return True
+
+    def array(self, kind, lookback):
+        key = (kind, lookback)
+        if key not in self.arrays:
+            path = os.path.join(self.root, self.version, '{}-{}.npy'.format(kind, lookback))
+            self.arrays[key] = np.load(path, mmap_mode = 'r')
+        return self.arrays[key]
+
+    def positions(self, tickers, lookback):
+
+        ## Index Rows for the Tickers, None if Any is Missing or Has Too Little History
+        if not self.load() or lookback not in self.manifest['lookbacks']:
+            return None
+        try:
+            idx = np.array([self.position[x] for x in tickers])
+        except KeyError:
+            return None
+        rows = self.manifest['lookbacks'][lookback]['rows']
+        if np.any(self.array('stats', lookback)[idx, 2] < MIN_COVERAGE*rows):
+            return None
+        return idx
+
+    def moments(self, tickers, lookback):
+
+        ## Sub-Covariance by Index Lookup, Only the Selected Rows Are Paged In
+        idx = self.positions(tickers, lookback)
+        if idx is None:
+            return None
+        mean = np.array(self.array('stats', lookback)[idx, 0])
+        cov = np.array(self.array('cov', lookback)[np.ix_(idx, idx)])
+        return mean, cov
+
+    def ticker_stats(self, tickers, lookback):
+
+        ## Annualised Return and Volatility per Ticker, Same Units as the Interactive Pages
+        idx = self.positions(tickers, lookback)
+        if idx is None:
+            return None
+        stats = np.array(self.array('stats', lookback)[idx])
+        return pd.DataFrame({'Return Annual': np.round(((1 + stats[:, 0])**252 - 1)*100, 3),
+                             'Volatilitas Annual': np.round(stats[:, 1]*np.sqrt(252)*100, 3)}, index = tickers)
+
+if __name__ == '__main__':
+
+    ## Nightly Batch Job: python -m port_engine.stats_index --build
+    if '--build' in sys.argv:
+
+        ## A Batch Job Can Wait for the Full Listing, the Cached or Bundled Universe is the Fallback
+        from port_engine import data, ticker_universe
+        try:
+            tickers = [x[0] for x in ticker_universe.refresh()['tickers']]
+        except Exception:
+            tickers = data.get_ticker()['Kode'].tolist()
+
+        ## The Engine's Store and Chart Fetcher, with its Rate Limit and Retries
+        start_date = datetime.date.today() - datetime.timedelta(int(max(LOOKBACKS.values())*365/252) + 30)
+        failed = data.price_store.update(tickers, start_date)
+        prices = data.price_store.prices(tickers, start_date, update = False)['Adj Close']
+        build = build_index(prices)
+        print('Built {} for {} tickers in {}, {} downloads failed'.format(build, len(prices.columns), DEFAULT_ROOT,
+                                                                          len(failed)))
+    else:
+        index = StatsIndex()
+        if index.load():
+            print('{} tickers, as of {}, build {}'.format(len(index.position), index.manifest['as_of'], index.version))
+        else:
+            print('No statistics index in {}, run python -m port_engine.stats_index --build'.format(DEFAULT_ROOT))
@@ -0,0 +1,165 @@
+## Opt-In Instrumentation: Timed Spans, Aggregates for Logs or Prometheus, Per-Request Breakdown
+## Enable with PORTFOLIO_TELEMETRY=1 (or port_engine.telemetry.enable()), expose /metrics with PORTFOLIO_TELEMETRY_PORT=9108
+import os
+import time
+import inspect
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+
+state = {'enabled': os.environ.get('PORTFOLIO_TELEMETRY', '') not in ('', '0'), 'server': None}
+stats = {}
+lock = threading.Lock()
+local = threading.local()
+logger = logging.getLogger('portfolio.telemetry')
+
+def enable(enabled = True):
+    state['enabled'] = enabled
+
+def reset():
+    with lock:
+        stats.clear()
+
+class Span:
+    __slots__ = ('name', 'attrs', 'start', 'depth')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.depth = getattr(local, 'depth', 0)
+        local.depth = self.depth + 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        local.depth = self.depth
+        record(self, seconds)
+        return False
+
+class NoSpan:
+
+    ## Shared Do-Nothing Span Returned While Disabled, No Clock Reads and No Allocation
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NO_SPAN = NoSpan()
+
+def span(name, **attrs):
+    if not state['enabled']:
+        return NO_SPAN
+    return Span(name, attrs)
+
+def record(span, seconds):
+
+    ## Process-Wide Aggregates, plus the Current Request's Span List When One is Being Collected
+    with lock:
+        entry = stats.setdefault(span.name, {'count': 0, 'seconds': 0.0, 'max': 0.0, 'nit': 0, 'nfev': 0})
+        entry['count'] += 1
+        entry['seconds'] += seconds
+        entry['max'] = max(entry['max'], seconds)
+        for field in ['nit', 'nfev']:
+            if isinstance(span.attrs.get(field), (int, float)):
+                entry[field] += span.attrs[field]
+    spans = getattr(local, 'spans', None)
+    if spans is not None:
+        spans.append(dict(name = span.name, ms = round(seconds*1e3, 3), depth = span.depth, **span.attrs))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('%s %.3f ms %s', span.name, seconds*1e3, span.attrs)
+
+def traced(name, args = (), result = ()):
+
+    ## Decorator Form: Named Arguments and Result Fields (e.g. nit, nfev) Become Span Attributes
+    def decorator(func):
+        signature = inspect.signature(func)
+        @functools.wraps(func)
+        def wrapper(*positional, **keywords):
+            if not state['enabled']:
+                return func(*positional, **keywords)
+            attrs = {}
+            if args:
+                bound = signature.bind(*positional, **keywords)
+                bound.apply_defaults()
+                attrs = {x: bound.arguments[x] for x in args}
+            with Span(name, attrs) as current:
+                value = func(*positional, **keywords)
+                for field in result:
+                    try:
+                        current.attrs[field] = int(value[field])
+                    except (KeyError, TypeError, ValueError, IndexError):
+                        pass
+            return value
+        return wrapper
+    return decorator
+
+@contextmanager
+def collect():
+
+    ## Gather Every Span Finished in this Thread, e.g. One Streamlit Script Run
+    previous = getattr(local, 'spans', None)
+    local.spans = spans = []
+    try:
+        yield spans
+    finally:
+        local.spans = previous
+
+def prometheus_text(prefix = 'portfolio'):
+    with lock:
+        snapshot = {name: dict(entry) for name, entry in stats.items()}
+    lines = []
+    metrics = [('span_seconds_total', 'seconds', 'counter', 'Total time spent in the span'),
+               ('span_count_total', 'count', 'counter', 'Number of finished spans'),
+               ('span_seconds_max', 'max', 'gauge', 'Slowest single span'),
+               ('optimizer_iterations_total', 'nit', 'counter', 'Optimizer iterations reported by the span'),
+               ('optimizer_evaluations_total', 'nfev', 'counter', 'Objective evaluations reported by the span')]
+    for metric, field, kind, help_text in metrics:
+        lines.append('# HELP {}_{} {}'.format(prefix, metric, help_text))
+        lines.append('# TYPE {}_{} {}'.format(prefix, metric, kind))
+        for name, entry in sorted(snapshot.items()):
+            if field in ['nit', 'nfev'] and entry[field] == 0:
+                continue
+            lines.append('{}_{}{{span="{}"}} {}'.format(prefix, metric, name, entry[field]))
+    return '\n'.join(lines) + '\n'
+
+def serve(port):
+
+    ## Prometheus Scrape Endpoint on a Daemon Thread, Started at Most Once per Process
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    if state['server'] is not None:
+        return state['server']
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            found = self.path.split('?')[0] in ['/', '/metrics']
+            body = prometheus_text().encode() if found else b''
+            self.send_response(200 if found else 404)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        def log_message(self, *args):
+            pass
+    try:
+        server = ThreadingHTTPServer(('', int(port)), Handler)
+    except OSError:
+        return None
+    threading.Thread(target = server.serve_forever, name = 'telemetry-metrics', daemon = True).start()
+    state['server'] = server
+    return server
+
+def serve_from_env():
+    port = os.environ.get('PORTFOLIO_TELEMETRY_PORT')
+    if state['enabled'] and port:
+        return serve(port)
+    return None
@@ -0,0 +1,174 @@
+## Ticker Universe: Disk Cache with TTL, Background Refresh and Offline Snapshot
+import os
+import sys
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import importlib.util
+
+import pandas as pd
+
+URL = 'https://id.wikipedia.org/wiki/Daftar_perusahaan_yang_tercatat_di_Bursa_Efek_Indonesia'
+COLUMNS = ['Kode', 'Nama Perusahaan', 'Tanggal Pencatatan']
+SCHEMA_VERSION = 1
+DEFAULT_TTL = 24*60*60
+RETRY_AFTER = 10*60
+CACHE_PATH = os.environ.get('TICKER_CACHE_PATH',
+                            os.path.join(os.path.expanduser('~'), '.cache', 'portfolio-analysis', 'tickers.json'))
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'idx_tickers.csv')
+
+refresh_lock = threading.Lock()
+
+## Universe Kept in Process Memory per Cache Path, so a Streamlit Rerun Neither Re-Reads Nor Re-Downloads it
+memory = {}
+
+def fetch_html(url = URL, timeout = 10):
+    import requests
+    page = requests.get(url, timeout = timeout)
+    page.raise_for_status()
+    return page.content
+
+def parse_tickers(html):
+
+    ## Only Build a Tree for Tables, with lxml When Available
+    from bs4 import BeautifulSoup, SoupStrainer
+    parser = 'lxml' if importlib.util.find_spec('lxml') is not None else 'html.parser'
+    soup = BeautifulSoup(html, parser, parse_only = SoupStrainer('table'))
+    rows = soup.select('table.wikitable tr') or soup.find_all('tr')
+
+    ## Collect Ticker Information, Header Rows Have No Data Cells
+    ticker_list = []
+    for row in rows:
+        cells = [cell.get_text().strip() for cell in row.find_all('td')]
+        if len(cells) < 3:
+            continue
+        idx = cells[0].replace('IDX: ', '')
+        date = cells[2].split('\xa0')[0]
+        ticker_list.append([idx, cells[1], date])
+    return ticker_list
+
+def universe_version(ticker_list):
+
+    ## Content Hash, Changes Whenever a Listing is Added, Removed or Renamed
+    payload = json.dumps(ticker_list, ensure_ascii = False).encode()
+    return hashlib.sha1(payload).hexdigest()[:12]
+
+def write_cache(ticker_list, path = CACHE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    content = {'schema': SCHEMA_VERSION, 'version': universe_version(ticker_list),
+               'fetched_at': time.time(), 'tickers': ticker_list}
+
+    ## Unique Temporary File per Writer, so Two Workers Refreshing at Once Never Rename a Partial File
+    fd, tmp = tempfile.mkstemp(prefix = os.path.basename(path) + '.', suffix = '.tmp', dir = os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'w', encoding = 'utf-8') as f:
+            json.dump(content, f, ensure_ascii = False)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return content
+
+def read_cache(path = CACHE_PATH):
+    try:
+        with open(path, encoding = 'utf-8') as f:
+            content = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if content.get('schema') != SCHEMA_VERSION or len(content.get('tickers', [])) == 0:
+        return None
+    return content
+
+def read_snapshot(path = SNAPSHOT_PATH):
+    try:
+        snapshot = pd.read_csv(path, dtype = str, keep_default_na = False)
+    except (OSError, ValueError):
+        return None
+    ticker_list = snapshot[COLUMNS].values.tolist()
+    return {'schema': SCHEMA_VERSION, 'version': universe_version(ticker_list), 'fetched_at': None,
+            'tickers': ticker_list}
+
+def refresh(path = CACHE_PATH, fetch = fetch_html):
+
+    ## Download, Parse and Persist, Keeping the Old Cache if Anything Fails
+    ticker_list = parse_tickers(fetch())
+    if len(ticker_list) == 0:
+        raise ValueError('No tickers found in the listing page')
+    content = write_cache(ticker_list, path)
+
+    ## The Next load_universe Picks Up the New Cache Instead of What Was Served Meanwhile
+    for key in [x for x in memory if x[0] == path]:
+        memory.pop(key, None)
+    return content
+
+def refresh_in_background(path = CACHE_PATH, fetch = fetch_html):
+
+    ## At Most One Refresh per Process at a Time
+    if not refresh_lock.acquire(blocking = False):
+        return None
+    def run():
+        try:
+            refresh(path, fetch)
+        except Exception:
+            pass
+        finally:
+            refresh_lock.release()
+    worker = threading.Thread(target = run, name = 'ticker-universe-refresh', daemon = True)
+    worker.start()
+    return worker
+
+def remember(key, content, expires):
+    memory[key] = (expires, content)
+    return content
+
+def load_universe(ttl = DEFAULT_TTL, path = CACHE_PATH, fetch = fetch_html, snapshot_path = SNAPSHOT_PATH):
+
+    ## Memory First, Until the Cache Goes Stale or a Failed Download is Due for a Retry
+    now = time.time()
+    key = (path, snapshot_path)
+    if key in memory and now < memory[key][0]:
+        return memory[key][1]
+
+    ## Serve the Disk Cache Immediately, Refreshing in the Background Once Stale
+    content = read_cache(path)
+    if content is not None:
+        if now - content['fetched_at'] > ttl:
+            remember(key, content, now + RETRY_AFTER)
+            refresh_in_background(path, fetch)
+            return content
+        return remember(key, content, content['fetched_at'] + ttl)
+
+    ## Cold Start: Serve the Bundled Snapshot Right Away and Download in the Background
+    content = read_snapshot(snapshot_path)
+    if content is not None:
+        remember(key, content, now + RETRY_AFTER)
+        refresh_in_background(path, fetch)
+        return content
+
+    ## No Snapshot to Fall Back On, the Page Has to Wait for the Network
+    try:
+        return remember(key, refresh(path, fetch), now + ttl)
+    except Exception:
+        content = {'schema': SCHEMA_VERSION, 'version': universe_version([]), 'fetched_at': None, 'tickers': []}
+        return remember(key, content, now + RETRY_AFTER)
+
+def load_tickers(**kwargs):
+    content = load_universe(**kwargs)
+    tickers = pd.DataFrame(content['tickers'], columns = COLUMNS)
+    tickers.attrs['version'] = content['version']
+    return tickers
+
+if __name__ == '__main__':
+
+    ## Regenerate the Bundled Snapshot: python -m port_engine.ticker_universe --snapshot
+    if '--snapshot' in sys.argv:
+        content = refresh()
+        os.makedirs(os.path.dirname(SNAPSHOT_PATH), exist_ok = True)
+        pd.DataFrame(content['tickers'], columns = COLUMNS).to_csv(SNAPSHOT_PATH, index = False)
+        print('Saved {} tickers (version {}) to {}'.format(len(content['tickers']), content['version'], SNAPSHOT_PATH))
+    else:
+        content = load_universe()
+        print('{} tickers, version {}'.format(len(content['tickers']), content['version']))
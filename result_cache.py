@@ -0,0 +1,190 @@
+## Content-Addressed Result Cache: In-Memory LRU with an Optional Shared On-Disk Tier
+import os
+import pickle
+import hashlib
+import tempfile
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MEMORY_MB = float(os.environ.get('RESULT_CACHE_MB', 256))
+DEFAULT_DISK_DIR = os.environ.get('RESULT_CACHE_DIR') or None
+DEFAULT_DISK_MB = float(os.environ.get('RESULT_CACHE_DISK_MB', 2048))
+
+## Other Workers Write to the Same Disk Tier, so the Tracked Size is Re-Measured Every So Many Writes
+## Pruning Trims Down to a Fraction of the Limit, Leaving Room for Writes Before the Next Walk
+PRUNE_EVERY = 100
+PRUNE_TARGET = 0.8
+
+def frame_key(frame):
+
+    ## Tickers, Dates and Every Value: Re-Adjusted Prices over the Same Date Range Get a New Key
+    values = frame.to_numpy()
+    if values.dtype == object:
+        values = pd.util.hash_pandas_object(frame, index = False).to_numpy()
+    digest = hashlib.blake2b(np.ascontiguousarray(values).tobytes(), digest_size = 16)
+    digest.update(pd.util.hash_pandas_object(frame.index, index = False).to_numpy().tobytes())
+    return (tuple(str(x) for x in frame.columns), frame.shape, str(values.dtype), digest.hexdigest())
+
+def part_key(part):
+    if isinstance(part, pd.DataFrame):
+        return frame_key(part)
+    if hasattr(part, 'cache_key'):
+        return part.cache_key()
+    if isinstance(part, np.ndarray):
+        return (part.shape, str(part.dtype), hashlib.blake2b(np.ascontiguousarray(part).tobytes(), digest_size = 16).hexdigest())
+    return part
+
+def make_key(namespace, *parts):
+    payload = repr((namespace,) + tuple(part_key(x) for x in parts))
+    return hashlib.blake2b(payload.encode(), digest_size = 16).hexdigest()
+
+class ResultCache:
+
+    def __init__(self, memory_mb = DEFAULT_MEMORY_MB, disk_dir = DEFAULT_DISK_DIR, disk_mb = DEFAULT_DISK_MB):
+        self.memory_limit = int(memory_mb*2**20)
+        self.disk_dir = disk_dir
+        self.disk_limit = int(disk_mb*2**20)
+        self.entries = OrderedDict()
+        self.memory_bytes = 0
+        self.disk_bytes = None
+        self.disk_writes = 0
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + '.pkl')
+
+    def remember(self, key, value, size):
+
+        ## Insert as Most Recent and Evict the Least Recently Used Beyond the Limit
+        if size > self.memory_limit:
+            return
+        if key in self.entries:
+            self.memory_bytes -= self.entries.pop(key)[1]
+        self.entries[key] = (value, size)
+        self.memory_bytes += size
+        while self.memory_bytes > self.memory_limit:
+            _, (_, old_size) = self.entries.popitem(last = False)
+            self.memory_bytes -= old_size
+            self.counters['evictions'] += 1
+
+    def get(self, key, default = None):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.counters['hits'] += 1
+                self.counters['memory_hits'] += 1
+                return self.entries[key][0]
+
+        ## Disk Tier is Shared by Every App Worker Pointing at the Same Directory
+        if self.disk_dir is not None:
+            try:
+                with open(self.path(key), 'rb') as f:
+                    payload = f.read()
+                os.utime(self.path(key))
+                value = pickle.loads(payload)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                value = None
+            else:
+                with self.lock:
+                    self.remember(key, value, len(payload))
+                    self.counters['hits'] += 1
+                    self.counters['disk_hits'] += 1
+                return value
+        with self.lock:
+            self.counters['misses'] += 1
+        return default
+
+    def put(self, key, value):
+        payload = pickle.dumps(value, protocol = pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.remember(key, value, len(payload))
+        if self.disk_dir is not None:
+            tmp = None
+            try:
+                os.makedirs(os.path.dirname(self.path(key)), exist_ok = True)
+                fd, tmp = tempfile.mkstemp(prefix = key + '.', suffix = '.tmp', dir = os.path.dirname(self.path(key)))
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(payload)
+                os.replace(tmp, self.path(key))
+            except OSError:
+                if tmp is not None and os.path.exists(tmp):
+                    os.remove(tmp)
+                return value
+
+            ## Walk the Disk Tier Only When the Tracked Size Goes Over the Limit or a Re-Measure is Due
+            with self.lock:
+                self.disk_writes += 1
+                if self.disk_bytes is not None:
+                    self.disk_bytes += len(payload)
+                due = (self.disk_bytes is None or self.disk_bytes > self.disk_limit
+                       or self.disk_writes % PRUNE_EVERY == 0)
+            if due:
+                self.prune()
+        return value
+
+    def prune(self):
+
+        ## Drop the Least Recently Read Files Once the Disk Tier Exceeds its Limit
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if name.endswith('.pkl'):
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+        total = sum(x[1] for x in files)
+        if total > self.disk_limit:
+            for _, size, path in sorted(files):
+                if total <= self.disk_limit*PRUNE_TARGET:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+        with self.lock:
+            self.disk_bytes = total
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.memory_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['entries'] = len(self.entries)
+            stats['memory_mb'] = round(self.memory_bytes/2**20, 3)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits']/lookups, 3) if lookups > 0 else None
+        return stats
+
+def cached(cache, key_args = None, skip = None):
+
+    ## Memoize on a Content Key Built from the Named Arguments, Defaults Included
+    def decorator(func):
+        signature = inspect.signature(func)
+        names = key_args or list(signature.parameters)
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            if skip is not None and skip(bound.arguments):
+                return func(*args, **kwargs)
+            key = make_key(func.__module__ + '.' + func.__qualname__, *[bound.arguments[x] for x in names])
+            missing = object()
+            value = cache.get(key, missing)
+            if value is missing:
+                value = cache.put(key, func(*args, **kwargs))
+            return value
+        wrapper.cache = cache
+        return wrapper
+    return decorator
@@ -6,6 +6,8 @@ import string
 
 ## Import Custom Functions
 from port_script import *
+from port_engine import telemetry
+from port_engine.data import stats_index
 
 ## Set Page Config
 st.set_page_config(page_title="Portfolio Anda", page_icon="🧊", layout="wide", initial_sidebar_state="expanded")
@@ -14,6 +16,19 @@ st.set_page_config(page_title="Portfolio Anda", page_icon="🧊", layout="wide",
 tickers = get_ticker()
 ticker_list = tickers['Kode'] + ' - ' + tickers['Nama Perusahaan']
 
+## Portfolio Size Limits: Per-Stock Inputs Up to 5, Large Universe Mode Up to 900
+MAX_STOCKS = 5
+MAX_LARGE_UNIVERSE = 900
+
+## Simulated VaR Paths, Capped in Large Universe Mode where Each Path Draws Hundreds of Correlated Returns
+## Multivariate Draws are Further Held to About SIM_BUDGET Path x Day x Asset^2 Operations (a Few Seconds)
+SIM_PATHS = 200000
+SIM_PATHS_LARGE = 20000
+SIM_BUDGET = 1e10
+
+## Prometheus Endpoint when PORTFOLIO_TELEMETRY and PORTFOLIO_TELEMETRY_PORT are Set
+telemetry.serve_from_env()
+
 def main():
     
     ## Base Input: Tickers, Start_Date, Sections
@@ -24,7 +39,12 @@ def main():
         st.info('**Susun Portfolio Anda di Sidebar**')
     st.sidebar.header('Susun Portfolio Anda')
     section = st.sidebar.radio('Pilih Halaman:', ('Performa Portfolio', 'Backtesting Portfolio'), index = 0)
-    myPicks = st.sidebar.multiselect(label = 'Pilih Saham (Maks. 5)', options = ticker_list)
+    large_universe = st.sidebar.checkbox('Mode Universe Besar (Maks. {} Saham)'.format(MAX_LARGE_UNIVERSE))
+    max_stocks = MAX_LARGE_UNIVERSE if large_universe else MAX_STOCKS
+    if large_universe and st.sidebar.checkbox('Pilih Semua Saham Terdaftar'):
+        myPicks = ticker_list.tolist()[:max_stocks]
+    else:
+        myPicks = st.sidebar.multiselect(label = 'Pilih Saham (Maks. {})'.format(max_stocks), options = ticker_list)
     start_date = st.sidebar.date_input(label = 'Tanggal Mulai', value = datetime.date.today() - datetime.timedelta(365))
     st.sidebar.header('Kontribusi')
     st.sidebar.info('''Ini adalah project **open source** yang dapat anda **bantu kembangkan** dengan memberikan **feedback** melalui email **raka.andria1@gmail.com** atau github **RakaAndriawan**''')
@@ -33,16 +53,43 @@ def main():
     
     ## Check Base Input
     num_stocks = len(myPicks)
-    if num_stocks > 5 or num_stocks < 2:
+    if num_stocks > max_stocks or num_stocks < 2:
         with sh2:
-            st.warning('**Portfolio diisi 2 hingga 5 saham**')
+            st.warning('**Portfolio diisi 2 hingga {} saham**'.format(max_stocks))
             return None
         
     ## Collect Datasets
+    ## Tickers Without Prices Raise, st.cache Keeps Nothing, so the Next Rerun Downloads Them Again
     with sh2:
         with st.spinner('Tunggu Proses Download Data Ya!'):
             myPicks = [x.split(' - ')[0] for x in myPicks]
-            recent_data = get_data(myPicks, start_date)
+            data_args = dict(min_coverage = 0.9 if large_universe else None,
+                             dtype = np.float32 if large_universe else np.float64)
+            try:
+                recent_data = get_data(myPicks, start_date, **data_args)
+            except MissingPrices as error:
+                st.warning('**Data saham {} tidak tersedia atau gagal diunduh, coba lagi nanti**'.format(', '.join(error.failed)))
+                if not large_universe:
+                    return None
+                
+                ## Large Universe: Continue Without the Failed Tickers for this Run Only
+                myPicks = [x for x in myPicks if x not in error.failed]
+                recent_data = get_data(myPicks, start_date, **data_args)
+            
+    ## Large Universe: Continue with the Tickers that Have Enough History
+    if large_universe:
+        dropped = len(myPicks) - len(recent_data.columns)
+        myPicks = [x for x in recent_data.columns]
+        num_stocks = len(myPicks)
+        if dropped > 0:
+            with sh2:
+                st.info('**{} saham dilewati karena data historis kurang lengkap**'.format(dropped))
+        if num_stocks < 2:
+            with sh2:
+                st.warning('**Data historis tidak cukup, pilih saham atau tanggal mulai lain**')
+                return None
+    solver = 'qp' if large_universe else 'scipy'
+    risk_model = 'factor' if large_universe else 'sample'
     
     ## Rendering First Page
     if section == 'Performa Portfolio':
@@ -56,7 +103,7 @@ def main():
         
         ## Organize Layout
         L0 = st.beta_container()
-        inp_weight = st.beta_columns(num_stocks)
+        inp_weight = st.beta_columns(num_stocks) if not large_universe else None
         L1A, L1B = st.beta_columns(2)
         L2A, L2B = st.beta_columns([1,5])
         st.header('**Resiko Portfolio Anda**')
@@ -64,11 +111,15 @@ def main():
         
         ## Ask for Custom Weights
         L0.subheader('**Tentukan Komposisi Portfolio Anda (%)**')
-        weights = np.zeros(num_stocks)
-        for i in range(0,num_stocks):
-            weights[i] = inp_weight[i].number_input(myPicks[i], min_value = 0.0, max_value = 100.0, value = 100/num_stocks, step = 0.1)        
+        if large_universe:
+            weights = np.full(num_stocks, 100/num_stocks)
+            L0.info('**Mode Universe Besar** menggunakan komposisi **Equal Weight** untuk {} saham'.format(num_stocks))
+        else:
+            weights = np.zeros(num_stocks)
+            for i in range(0,num_stocks):
+                weights[i] = inp_weight[i].number_input(myPicks[i], min_value = 0.0, max_value = 100.0, value = 100/num_stocks, step = 0.1)        
             
-        if sum(weights) != 100:
+        if not large_universe and sum(weights) != 100:
             warn = 'Pastikan Total Komposisi 100%! Komposisi Saat Ini : {}%'.format(sum(weights))
             st.text(warn)
             return None
@@ -77,15 +128,17 @@ def main():
         with sh2:
             with st.spinner('Tunggu Proses Kalkulasi Ya!'):
                 weights = [x/100 for x in weights]
-                result = core_plot_data(recent_data, weights)
+                analysis = portfolio_analysis(recent_data, weights)
                 
         ## Visualize DataFrame
         with L1A:
             st.subheader('**Data Returns Portfolio**')
-            display_data = result[2]
-            display_data.index = pd.to_datetime(display_data.index, format = '%m/%d/%Y').strftime('%Y-%m-%d')
-            L1A.dataframe(display_data.style.applymap(negative_red))
-            display_data.index = pd.DatetimeIndex(display_data.index)
+            display_data = analysis.returns
+            shown_data = display_data.set_index(display_data.index.strftime('%Y-%m-%d'))
+            if large_universe:
+                L1A.dataframe(shown_data)
+            else:
+                L1A.dataframe(shown_data.style.applymap(negative_red))
             
             ## Create Download Link
             if st.button('Download Data Return', key = 'first_df'):
@@ -95,7 +148,7 @@ def main():
         ## Highlights Key Values
         with L1B:
             st.subheader('**Summary Performa Portfolio**')
-            kpi = result[0]
+            kpi = analysis.summary
             keys = list(kpi.keys())
             
             ## Returns
@@ -120,23 +173,33 @@ def main():
         ## Checkbox Assets to Plots
         with L2A:
             st.subheader('**Pilih Variabel untuk Divisualisasi**')
-            var = np.zeros(num_stocks + 1)
-            var[0] = st.checkbox('Portfolio', value = True)   
-            for i in range(1,(num_stocks + 1)):
-                var[i] = st.checkbox(myPicks[i-1])
+            if large_universe:
+                
+                ## Large Universe: Plot Only the Best Performing Tickers
+                num_top = st.slider('Jumlah Saham Teratas', min_value = 1, max_value = min(10, num_stocks), value = min(5, num_stocks))
+                show_port = st.checkbox('Portfolio', value = True)
+                top_var = top_assets(analysis.cumulative, num_top)
+            else:
+                var = np.zeros(num_stocks + 1)
+                var[0] = st.checkbox('Portfolio', value = True)   
+                for i in range(1,(num_stocks + 1)):
+                    var[i] = st.checkbox(myPicks[i-1])
             st.markdown('Gunakan slider dibawah plot untuk mengubah range waktu dari plot')
             
             ## Create Download Link
             if st.button('Download Data Return Kumulatif', key = 'fifth_df'):
-                tmp_download_link = download_link(result[1], 'cumulative_returns.csv', 'DOWNLOAD!')
+                tmp_download_link = download_link(analysis.cumulative, 'cumulative_returns.csv', 'DOWNLOAD!')
                 st.markdown(tmp_download_link, unsafe_allow_html=True)
             
         ## Cumulative Returns Plot
         with L2B:
-            my_var = ['Portfolio'] + result[5]
-            my_key_var = [my_var[i] for i in range(0,len(my_var)) if var[i] == 1]
+            if large_universe:
+                my_key_var = (['Portfolio'] if show_port else []) + top_var
+            else:
+                my_var = ['Portfolio'] + analysis.tickers
+                my_key_var = [my_var[i] for i in range(0,len(my_var)) if var[i] == 1]
             if len(my_key_var) > 0:
-                plot_cum_return = asset_cumulative_return(result[1], my_key_var)
+                plot_cum_return = asset_cumulative_return(analysis.cumulative, my_key_var)
                 st.plotly_chart(plot_cum_return, use_container_width = True)
           
         ## Correlation Plot
@@ -147,40 +210,62 @@ def main():
             Anda juga dapat memilih saham yang berhubungan secara positif untuk memaksimalkan return yang anda bisa dapatkan.
             Tidak jarang juga, saham yang dipilih tidak memiliki hubungan apapun untuk meminimalkan resiko<br>
             <b>Strategi Ada Di Tangan Anda</b></p>''', unsafe_allow_html = True)
-            plot_corr = asset_corr_plot(result[4], result[5])
+            plot_corr = asset_corr_plot(analysis.correlation, analysis.tickers)
             st.plotly_chart(plot_corr)
         
         with L3B:
             risk_plot = st.selectbox('Pilih Grafik untuk Menggambarkan Resiko Portfolio Anda',
-                         ['Rolling Volatilitas Annual', 'VaR dan CVaR', 'Drawdown'], index = 1)
+                         ['Analisa Rolling', 'VaR dan CVaR', 'Drawdown'], index = 1)
             
-            ## Rolling Volatilitas Annual
-            if risk_plot == 'Rolling Volatilitas Annual':
+            ## Rolling Analytics, Every Window and Metric Comes from One Set of Prefix Sums
+            if risk_plot == 'Analisa Rolling':
                 st.markdown('''<p style="text-align:justify;">
-                Rolling Volatilitas Annual merupakan suatu teknik untuk mengestimasi nilai volatilitas annual berdasarkan jangka waktu tertentu.
+                Analisa Rolling merupakan suatu teknik untuk mengestimasi nilai suatu ukuran berdasarkan jangka waktu tertentu yang bergeser setiap hari.
                 Volatilias Annual sendiri merupakan ukuran yang digunakan untuk mengestimasi fluktuasi nilai return selama setahun.
                 Semakin besar nilai volatilitas annual maka dapat dikatakan performa portfolio anda semakin tidak stabil.
+                Beta dan Korelasi menunjukkan seberapa kuat setiap saham bergerak bersama portfolio anda.
                 </p>''', unsafe_allow_html = True)
-                window = st.slider('Pilih Rentang Waktu Rolling Volatilitas Annual', min_value = 2, max_value = 30,  value = 5)
-                plot_rolling = rolling_volatility(result[2], window)
+                RO1, RO2 = st.beta_columns(2)
+                rolling_metric = RO1.selectbox('Pilih Ukuran Rolling', ['Volatilitas Annual', 'Sharpe Ratio', 'Beta terhadap Portfolio',
+                                                                       'Korelasi terhadap Portfolio', 'Drawdown'], index = 0)
+                window = RO2.slider('Pilih Rentang Waktu Rolling', min_value = 2, max_value = 30,  value = 5)
+                rolling_tickers = top_assets(analysis.cumulative, 10) if large_universe else None
+                plot_rolling = rolling_analytics(analysis.returns, window, rolling_metric, rolling_tickers)
                 st.plotly_chart(plot_rolling, use_container_width = True)
             
             ## Histogram VaR dan CVaR
             if risk_plot == 'VaR dan CVaR':
                 alpha = st.slider('Pilih Level Kepercayaan Anda (%)', min_value = 90, max_value = 99,  value = 95)
-                plot_hist, risk = var_cvar(result[2], alpha)
+                plot_hist, risk = var_cvar(analysis.portfolio.to_frame(), alpha)
                 st.markdown('''<p style="text-align:justify;">
                 Nilai VaR dan CVaR merupakan ukuran yang digunakan untuk mengestimasi kemungkinan kerugian berdasarkan level kepercayaan tertentu. Sebagai contoh pada plot anda, nilai VaR pada level kepercayaan {}% menyatakan bahwa terdapat {}% kemungkinan nilai investasi anda turun lebih besar dari {}% dalam satu hari. Sedangkan nilai CVaR pada level kepercayaan yang sama menyatakan bahwa pada {}% kondisi terburuk, rata-rata kerugian anda sebesar {}% dalam satu hari.
                 </p>'''.format(alpha, (100-alpha), round(-(risk[0]*100), 3), (100-alpha), round(-(risk[1]*100), 3)),
                 unsafe_allow_html = True)
                 st.plotly_chart(plot_hist, use_container_width = True)
+
+                ## Simulated VaR and CVaR over a Chosen Horizon
+                ## Large Universe Defaults to the Factor Model, Full Multivariate Draws Cost O(n^2) per Day per Path
+                sim_methods = {'Normal Parametrik': 'normal', 'Monte Carlo Multivariat': 'multivariate',
+                               'Monte Carlo Model Faktor': 'factor', 'Bootstrap Blok': 'bootstrap'}
+                SM1, SM2 = st.beta_columns(2)
+                sim_method = SM1.selectbox('Metode Simulasi', list(sim_methods), index = 2 if large_universe else 1)
+                horizon = SM2.slider('Horizon Simulasi (Hari)', min_value = 1, max_value = 20, value = 1)
+                num_paths = SIM_PATHS
+                if large_universe:
+                    num_paths = SIM_PATHS_LARGE
+                    if sim_methods[sim_method] == 'multivariate':
+                        num_paths = int(max(1000, min(num_paths, SIM_BUDGET / (horizon*num_stocks**2))))
+                sim = simulate_var_cvar(recent_data, weights, sim_methods[sim_method], alpha, horizon, num_paths, seed = 0)
+                st.info('**VaR Simulasi** : {}% (CI 95%: {}% s/d {}%) || **CVaR Simulasi** : {}% (CI 95%: {}% s/d {}%)'.format(
+                    round(sim['VaR']*100, 3), round(sim['VaR CI'][0]*100, 3), round(sim['VaR CI'][1]*100, 3),
+                    round(sim['CVaR']*100, 3), round(sim['CVaR CI'][0]*100, 3), round(sim['CVaR CI'][1]*100, 3)))
                 
             ## Max Drawdown
             if risk_plot == 'Drawdown':
                 st.markdown('''<p style="text-align:justify;">
                 Drawdown adalah penurunan nilai return kumulatif anda, atau penurunan nilai portfolio anda. Sedangkan Max Drawdown adalah penurunan maksimum nilai portfolio anda dari titik tertinggi ke titik terendak, sebelum bisa ke titik tertinggi lagi. Nilai ini dapat digunakan untuk mengetahui seberapa besar kerugian yang dapat kita terima dalam kondisi terbaik portfolio kita.
                 </p>''', unsafe_allow_html = True)
-                plot_drawdown = drawdown_vis(result[3])
+                plot_drawdown = drawdown_vis(analysis.drawdown)
                 st.plotly_chart(plot_drawdown, use_container_width = True)
 
     ## Render Process for Second Page
@@ -204,6 +289,12 @@ def main():
             exp_value = st.number_input('Ekspektasi Nilai Return Annual', min_value = 0.0, max_value = 100.0, value = 20.0, step = 0.1)
             risk_free = st.number_input('Nilai Risk Free Return', min_value = 0.0, max_value = 100.0, value = 0.0, step = 0.1)
             
+            ## Optional Precomputed Statistics from the Nightly Index
+            stat_sources = {'Data Sejak Tanggal Mulai': None}
+            if stats_index.load():
+                stat_sources.update({'Indeks Statistik {} (per {})'.format(x, stats_index.manifest['as_of']): x for x in LOOKBACKS})
+            stat_source = st.selectbox('Sumber Statistik Optimisasi', list(stat_sources), index = 0)
+            
             ## Explain Strategy
             st.subheader('**Penjelasan Strategi Portfolio**')
             st.markdown('''<p style="text-align:justify;">
@@ -216,11 +307,11 @@ def main():
             </ul></p>''', unsafe_allow_html = True)
 
         ## Calculation for Second Page
-        if 'Portfolio' in recent_data.columns:
-            recent_data = recent_data.drop(columns=['Portfolio'])
         with sh2:
             with st.spinner('Tunggu Proses Kalkulasi Ya!'):
-                compiled_port = markowitz_portfolio(recent_data, max_exp = exp_value, rf = risk_free)
+                compiled_port = markowitz_portfolio(recent_data, max_exp = exp_value, rf = risk_free, solver = solver,
+                                                    lookback = stat_sources[stat_source], stats_version = stats_index.version,
+                                                    risk_model = risk_model)
                 ef_plot = visualize_ef(compiled_port)
         
         ## Displaying DataFrame
@@ -264,33 +355,58 @@ def main():
         ## Ask for Custom Weights
         st.subheader('**Tentukan Komposisi Portfolio Anda (%)**')
         max_ef = compiled_port[2].mul(100).iloc[-1,3:].tolist()
-        inp_weight = st.beta_columns(num_stocks)
-        custom_weight = np.zeros(num_stocks)
-        for i in range(0,num_stocks):
-            custom_weight[i] = inp_weight[i].number_input(myPicks[i], min_value = 0.0, max_value = 100.0, value = max_ef[i], step = 0.1)
+        if large_universe:
+            custom_weight = np.array(max_ef)
+            custom_weight = custom_weight / np.sum(custom_weight) * 100
+            st.info('**Mode Universe Besar** menggunakan komposisi Efficient Frontier dengan return tertinggi sebagai strategi custom')
+        else:
+            inp_weight = st.beta_columns(num_stocks)
+            custom_weight = np.zeros(num_stocks)
+            for i in range(0,num_stocks):
+                custom_weight[i] = inp_weight[i].number_input(myPicks[i], min_value = 0.0, max_value = 100.0, value = max_ef[i], step = 0.1)
                         
-        if sum(custom_weight) != 100:
+        if not large_universe and sum(custom_weight) != 100:
             warn = 'Pastikan Total Komposisi 100%! Komposisi Saat Ini : {}%'.format(sum(custom_weight))
             st.text(warn)
             return None
 
+        ## Ask for Rebalancing Rule and Transaction Cost
+        rebalance_options = {'Harian': 'daily', 'Bulanan': 'monthly', 'Kuartalan': 'quarterly',
+                             'Saat Komposisi Menyimpang (Threshold)': 'threshold', 'Tanpa Rebalancing (Buy and Hold)': 'none'}
+        RB1, RB2, RB3 = st.beta_columns(3)
+        rebalance = RB1.selectbox('Frekuensi Rebalancing', list(rebalance_options), index = 0)
+        cost = RB2.number_input('Biaya Transaksi (%)', min_value = 0.0, max_value = 5.0, value = 0.0, step = 0.05)
+        threshold = RB3.number_input('Batas Penyimpangan Komposisi (%)', min_value = 1.0, max_value = 50.0, value = 5.0, step = 0.5)
+        WF1, WF2 = st.beta_columns(2)
+        use_walk_forward = WF1.checkbox('Tambahkan MSR dan GMV Walk-Forward (Optimisasi Ulang Setiap Bulan)')
+        max_lookback = max(20, min(1000, len(recent_data) - 2))
+        lookback = WF2.number_input('Rentang Data Optimisasi Walk-Forward (Hari)', min_value = 20, max_value = max_lookback,
+                                    value = min(126, max_lookback), step = 1)
         
         ## Calculation for Comparation
         with sh2:
             with st.spinner('Tunggu Proses Kalkulasi Ya!'):
                 custom_weight = [x/100 for x in custom_weight]
-                str_df, str_fig = cumulative_performance(recent_data, compiled_port[1], custom_weight)
+                str_df, str_fig, str_turnover = cumulative_performance(recent_data, compiled_port[1], custom_weight,
+                                                                       rebalance_options[rebalance], cost/100,
+                                                                       threshold/100,
+                                                                       int(lookback) if use_walk_forward else None,
+                                                                       risk_free, solver)
+            if use_walk_forward and 'MSR (Walk-Forward)' not in str_df.columns:
+                st.warning('**Data historis tidak cukup untuk Walk-Forward {} hari, pilih rentang lebih pendek atau tanggal mulai lebih awal**'.format(int(lookback)))
                 
         ## Place the Charts
         L3A, L3B = st.beta_columns([2,1])
         L3A.plotly_chart(str_fig, use_container_width = True)
+        
+        ## Turnover per Strategy: Sum of Traded Weight, Number of Rebalances and Total Cost
+        L3A.subheader('**Turnover dan Biaya Transaksi**')
+        L3A.dataframe(str_turnover)
         with L3B:
             st.subheader('**Data Performa Strategi Portfolio**')
             
             ## Visualize DataFrame
-            str_df.index = pd.to_datetime(str_df.index, format = '%m/%d/%Y').strftime('%Y-%m-%d')
-            L3B.dataframe(str_df.style.applymap(negative_red))
-            str_df.index = pd.DatetimeIndex(str_df.index)  
+            L3B.dataframe(str_df.set_index(str_df.index.strftime('%Y-%m-%d')).style.applymap(negative_red))
             
             ## Create Download Link
             if st.button('Download Data Return Kumulatif', key = 'fourth_df'):
@@ -298,5 +414,24 @@ def main():
                 st.markdown(tmp_download_link, unsafe_allow_html=True)
         
         
+def debug_panel(spans):
+    
+    ## Timing Breakdown of this Script Run, Only Offered when Telemetry is Enabled
+    if not telemetry.state['enabled'] or not st.sidebar.checkbox('Tampilkan Panel Debug'):
+        return
+    with st.beta_expander('Panel Debug: Rincian Waktu', expanded = True):
+        if len(spans) == 0:
+            st.info('Belum ada span yang tercatat')
+        else:
+            span_df = pd.DataFrame(spans)
+            span_df['name'] = ['  '*x + y for x, y in zip(span_df['depth'], span_df['name'])]
+            st.dataframe(span_df.drop(columns = 'depth'))
+            total_df = pd.DataFrame(spans).groupby('name')['ms'].agg(['count', 'sum', 'max'])
+            st.dataframe(total_df.sort_values('sum', ascending = False))
+        st.write('Result Cache:', result_cache.stats())
+        st.text(telemetry.prometheus_text())
+        
 if __name__ == '__main__':
-    main()
+    with telemetry.collect() as spans:
+        main()
+    debug_panel(spans)
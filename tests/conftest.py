@@ -0,0 +1,5 @@
+## Tests Import the Repository's Top-Level Modules, the Same Way the App Does
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,62 @@
+## Backtesting: the Chunked Engine Against a Naive Day-by-Day Loop
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.bench_moments import synthetic_returns
+from port_engine import backtest, rebalance_schedule, strategy_returns
+
+def naive_backtest(my_data, weights, rebalance, threshold = 0.05, cost = 0.0):
+
+    ## Drift the Holdings One Day at a Time, Trade Back to Target at the Close When the Rule Says So
+    values = np.asarray(my_data, dtype = float)
+    period_end = rebalance_schedule(my_data.index, rebalance)
+    holdings = np.array(weights, dtype = float)
+    net, turnover = np.zeros(len(values)), np.zeros(len(values))
+    for day, returns in enumerate(values):
+        gross = holdings.dot(returns)
+        net[day] = (1 - cost*turnover[day])*(1 + gross) - 1
+        holdings = holdings*(1 + returns) / (1 + gross)
+        if day == len(values) - 1:
+            break
+        if (rebalance == 'daily' or (rebalance in ['monthly', 'quarterly'] and period_end[day])
+                or (rebalance == 'threshold' and np.max(np.abs(holdings - weights)) > threshold)):
+            turnover[day + 1] = np.abs(holdings - weights).sum()
+            holdings = np.array(weights, dtype = float)
+    return net, turnover
+
+@pytest.fixture(scope = 'module')
+def my_data():
+    return synthetic_returns(12, 3)
+
+@pytest.fixture(scope = 'module')
+def weights():
+    return np.random.default_rng(7).dirichlet(np.ones(12))
+
+@pytest.mark.parametrize('rebalance, threshold', [('daily', 0.05), ('none', 0.05), ('monthly', 0.05),
+                                                  ('quarterly', 0.05), ('threshold', 0.02), ('threshold', 0.001)])
+@pytest.mark.parametrize('chunk', [5, 252])
+def test_chunked_engine_matches_naive_loop(my_data, weights, rebalance, threshold, chunk):
+    net, turnover = backtest(my_data, weights, rebalance, threshold, cost = 0.002, chunk = chunk)
+    naive_net, naive_turnover = naive_backtest(my_data, weights, rebalance, threshold, cost = 0.002)
+    assert np.allclose(net, naive_net, rtol = 0, atol = 1e-12)
+    assert np.allclose(turnover, naive_turnover, rtol = 0, atol = 1e-12)
+
+def test_threshold_rebalances_are_counted(my_data, weights):
+    _, turnover = backtest(my_data, weights, 'threshold', 0.001)
+    _, naive_turnover = naive_backtest(my_data, weights, 'threshold', 0.001)
+    assert (turnover > 0).sum() == (naive_turnover > 0).sum() > len(my_data) // 2
+
+def test_strategy_returns_reports_turnover(my_data):
+    port_strategy = pd.DataFrame(np.column_stack([np.zeros((4, 3)), np.full((4, 12), 1/12)]))
+    cum_df, summary = strategy_returns(my_data, port_strategy, np.full(12, 1/12), 'monthly', cost = 0.001)
+    assert list(summary.index) == list(cum_df.columns) == ['Custom', 'EW', 'MCap', 'MSR', 'GMV']
+    assert list(summary.columns) == ['Turnover', 'Jumlah Rebalancing', 'Biaya Transaksi (%)']
+    assert (summary['Jumlah Rebalancing'] == rebalance_schedule(my_data.index, 'monthly')[:-1].sum()).all()
+    assert summary['Biaya Transaksi (%)'].values == pytest.approx(summary['Turnover'].values*0.1, abs = 1e-3)
+
+def test_strategy_returns_reports_walk_forward_turnover(my_data):
+    port_strategy = pd.DataFrame(np.column_stack([np.zeros((4, 3)), np.full((4, 12), 1/12)]))
+    cum_df, summary = strategy_returns(my_data, port_strategy, np.full(12, 1/12), walk_forward_lookback = 126)
+    assert 'MSR (Walk-Forward)' in cum_df.columns and 'GMV (Walk-Forward)' in summary.index
+    assert summary.loc['GMV (Walk-Forward)', 'Turnover'] > 0
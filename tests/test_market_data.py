@@ -0,0 +1,144 @@
+## Market Data: ChartFetcher Against a Local Fake Chart Server, Retries, Rate Limit and Partial Failure
+import json
+import datetime
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import port_engine.data
+from port_engine.market_data import ChartFetcher, TokenBucket, MissingPrices, parse_chart
+from port_engine.price_store import PriceStore
+
+DATES = pd.bdate_range('2024-01-02', periods = 5)
+
+def chart_body(closes):
+
+    ## Bars Stamped at the 09:00 WIB Open, as the Real Endpoint Does
+    timestamps = [int((x - pd.Timestamp('1970-01-01')).total_seconds()) + 2*3600 for x in DATES[:len(closes)]]
+    return json.dumps({'chart': {'error': None, 'result': [{
+        'meta': {'gmtoffset': 7*3600}, 'timestamp': timestamps,
+        'indicators': {'quote': [{'close': closes, 'volume': [1000.0]*len(closes)}],
+                       'adjclose': [{'adjclose': closes}]}}]}}).encode()
+
+class FakeChartServer:
+
+    ## Each Ticker Has a Script of Statuses, the Last One Repeats, Every Request is Logged
+    def __init__(self):
+        self.scripts = {}
+        self.requests = []
+        self.lock = threading.Lock()
+        server = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                ticker = urlparse(self.path).path.rsplit('/', 1)[-1].replace('.JK', '')
+                with server.lock:
+                    server.requests.append(ticker)
+                    script = server.scripts.get(ticker, [404])
+                    status = script.pop(0) if len(script) > 1 else script[0]
+                body = chart_body([100.0, 101.0, 102.0, 101.5, 103.0]) if status == 200 else b'{}'
+                self.send_response(status)
+                if status == 429:
+                    self.send_header('Retry-After', '3')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, *args):
+                pass
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{}'.format(self.httpd.server_address[1])
+        threading.Thread(target = self.httpd.serve_forever, daemon = True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+@pytest.fixture
+def server():
+    fake = FakeChartServer()
+    yield fake
+    fake.close()
+
+@pytest.fixture
+def sleeps():
+    return []
+
+@pytest.fixture
+def fetcher(server, sleeps):
+    return ChartFetcher(base_url = server.url, workers = 4, rate = 1000, retries = 3, backoff = 0.1,
+                        sleep = sleeps.append)
+
+def test_parse_chart_uses_exchange_dates():
+    frame = parse_chart(chart_body([100.0, 101.0]))
+    assert list(frame.index) == list(DATES[:2])
+    assert list(frame.columns) == ['Adj Close', 'Volume']
+
+def test_retries_transient_errors(server, fetcher, sleeps):
+    server.scripts['BBCA'] = [503, 502, 200]
+    result = fetcher(['BBCA'], datetime.date(2024, 1, 1), datetime.date(2024, 1, 9))
+    assert server.requests == ['BBCA']*3
+    assert len(result['BBCA']) == 5
+    assert result.failed == {}
+    assert len(sleeps) == 2 and sleeps[1] > sleeps[0]*0.5
+
+def test_retry_after_header_is_honoured(server, fetcher, sleeps):
+    server.scripts['TLKM'] = [429, 200]
+    fetcher(['TLKM'], datetime.date(2024, 1, 1), datetime.date(2024, 1, 9))
+    assert sleeps == [3.0]
+
+def test_gives_up_after_retries(server, fetcher):
+    server.scripts['ASII'] = [500]
+    result = fetcher(['ASII'], datetime.date(2024, 1, 1), datetime.date(2024, 1, 9))
+    assert server.requests == ['ASII']*4
+    assert 'ASII' not in result and 'HTTP 500' in result.failed['ASII']
+
+def test_partial_failure_is_reported_per_call(server, fetcher):
+    server.scripts.update({'BBCA': [200], 'BMRI': [200], 'XXXX': [404]})
+    first = fetcher(['BBCA', 'XXXX', 'BMRI'], datetime.date(2024, 1, 1), datetime.date(2024, 1, 9))
+    assert sorted(first) == ['BBCA', 'BMRI']
+    assert list(first.failed) == ['XXXX'] and 'HTTP 404' in first.failed['XXXX']
+    assert server.requests.count('XXXX') == 1
+
+    ## Another Session's Call on the Same Fetcher Starts Clean
+    second = fetcher(['BBCA'], datetime.date(2024, 1, 1), datetime.date(2024, 1, 9))
+    assert second.failed == {}
+
+def test_token_bucket_limits_request_rate():
+    clock = {'now': 0.0}
+    def sleep(seconds):
+        clock['now'] += seconds
+    bucket = TokenBucket(rate = 2, burst = 2, clock = lambda: clock['now'], sleep = sleep)
+    for _ in range(6):
+        bucket.acquire()
+
+    ## Burst of 2 is Free, the Other 4 Tokens Refill at 2 per Second
+    assert clock['now'] == pytest.approx(2.0)
+
+def test_fetcher_waits_on_the_rate_limit(server, sleeps):
+    server.scripts.update({x: [200] for x in ['AALI', 'ADRO', 'AKRA', 'ANTM']})
+    clock = {'now': 0.0}
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock['now'] += seconds
+    fetcher = ChartFetcher(base_url = server.url, workers = 2, sleep = sleep)
+    fetcher.bucket = TokenBucket(rate = 1, burst = 1, clock = lambda: clock['now'], sleep = sleep)
+    result = fetcher(['AALI', 'ADRO', 'AKRA', 'ANTM'], datetime.date(2024, 1, 1), datetime.date(2024, 1, 9))
+    assert len(result) == 4
+    assert clock['now'] == pytest.approx(3.0)
+
+def test_get_data_raises_on_failed_ticker_and_recovers(server, fetcher, tmp_path, monkeypatch):
+    server.scripts.update({'BBCA': [200], 'GOTO': [503]})
+    store = PriceStore(str(tmp_path), fetcher, lambda: pd.Timestamp('2024-01-10 18:00', tz = 'Asia/Jakarta'))
+    monkeypatch.setattr(port_engine.data, 'price_store', store)
+    with pytest.raises(MissingPrices) as error:
+        port_engine.data.get_data(['BBCA', 'GOTO'], datetime.date(2024, 1, 1))
+    assert list(error.value.failed) == ['GOTO']
+
+    ## The Failed Range Stays Uncovered, the Next Call Downloads it Again
+    server.scripts['GOTO'] = [200]
+    returns = port_engine.data.get_data(['BBCA', 'GOTO'], datetime.date(2024, 1, 1))
+    assert returns.shape == (4, 2)
+    assert np.allclose(returns.values[:, 1], returns.values[:, 0])
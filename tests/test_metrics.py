@@ -0,0 +1,69 @@
+## Metrics: Precomputed Moments Against the Previous Pandas Evaluation, Seeded VaR/CVaR Simulation
+import numpy as np
+import pytest
+
+from benchmarks.bench_moments import synthetic_returns, dataframe_performance
+from port_engine import (as_returns, portfolio_moments, portfolio_performance, batch_performance,
+                         evaluate_portfolios, simulate_var_cvar)
+
+@pytest.mark.parametrize('num_assets, years', [(5, 1), (50, 5), (200, 10)])
+def test_moments_match_dataframe_performance(num_assets, years):
+    my_data = synthetic_returns(num_assets, years)
+    moments = portfolio_moments(my_data)
+    rng = np.random.default_rng(num_assets)
+    for weights in [np.full(num_assets, 1./num_assets), rng.dirichlet(np.ones(num_assets))]:
+        old = dataframe_performance(weights, my_data, risk_free = 2)
+        for new in [portfolio_performance(weights, moments, 2), portfolio_performance(weights, my_data, 2)]:
+            for key in old:
+                assert new[key] == pytest.approx(old[key], rel = 1e-9), key
+
+def test_moments_accept_returns_matrix_and_pass_through():
+    my_data = synthetic_returns(8, 2)
+    moments = portfolio_moments(my_data)
+    assert portfolio_moments(moments) is moments
+    matrix = portfolio_moments(as_returns(my_data))
+    assert np.allclose(matrix.mean, moments.mean) and np.allclose(matrix.cov, moments.cov)
+
+def test_targets_match_the_full_evaluation():
+    my_data = synthetic_returns(10, 3)
+    moments = portfolio_moments(my_data)
+    weights = np.random.default_rng(0).dirichlet(np.ones(10))
+    full = portfolio_performance(weights, moments, 2)
+    assert portfolio_performance(weights, moments, 2, 'max_sharpe_ratio') == -full['Sharpe Ratio']
+    assert portfolio_performance(weights, moments, 2, 'min_volatility') == full['Volatilitas Annual']
+
+def test_batch_and_evaluate_portfolios_agree_with_single_evaluation():
+    my_data = synthetic_returns(12, 2)
+    weight_matrix = np.random.default_rng(1).dirichlet(np.ones(12), 4)
+    batch = batch_performance(weight_matrix, my_data, 2)
+    evaluated = evaluate_portfolios(my_data, weight_matrix, 2)['summary']
+    for i, weights in enumerate(weight_matrix):
+        old = dataframe_performance(weights, my_data, risk_free = 2)
+        for key in old:
+            assert batch[key].iloc[i] == pytest.approx(old[key], rel = 1e-9), key
+            assert evaluated[key].iloc[i] == pytest.approx(old[key], rel = 1e-9), key
+
+@pytest.mark.parametrize('method', ['normal', 'multivariate', 'factor', 'bootstrap'])
+def test_simulation_is_reproducible_and_ci_contains_estimate(method):
+    my_data = synthetic_returns(6, 2)
+    weights = np.full(6, 1/6)
+    first = simulate_var_cvar(my_data, weights, method, horizon = 5, num_paths = 20000, seed = 42)
+    second = simulate_var_cvar(my_data, weights, method, horizon = 5, num_paths = 20000, seed = 42)
+    assert first == second
+    assert first['VaR CI'][0] <= first['VaR'] <= first['VaR CI'][1]
+    assert first['CVaR CI'][0] <= first['CVaR'] <= first['CVaR CI'][1]
+    assert first['CVaR'] <= first['VaR'] < 0
+
+def test_small_batches_cover_every_path():
+    my_data = synthetic_returns(4, 1)
+    result = simulate_var_cvar(my_data, np.full(4, 0.25), 'bootstrap', horizon = 10, num_paths = 5000, seed = 0,
+                               max_elements = 999)
+    assert result['paths'] == 5000 and np.isfinite(result['VaR'])
+
+def test_bootstrap_on_history_shorter_than_a_block():
+    my_data = synthetic_returns(3, 1).iloc[:3]
+    result = simulate_var_cvar(my_data, np.full(3, 1/3), 'bootstrap', horizon = 10, num_paths = 1000, block_size = 5,
+                               seed = 0)
+    assert np.isfinite(result['VaR']) and np.isfinite(result['CVaR'])
+    with pytest.raises(ValueError):
+        simulate_var_cvar(my_data.iloc[:0], np.full(3, 1/3), 'bootstrap', num_paths = 10, seed = 0)
@@ -0,0 +1,80 @@
+## Optimization: Analytic Gradients Against Finite Differences, Warm-Started Frontier
+import warnings
+
+import numpy as np
+import pytest
+
+from benchmarks.bench_moments import synthetic_returns
+from port_engine import (portfolio_gradient, portfolio_moments, portfolio_performance, Moments, optimize,
+                         efficient_frontier, frontier_iterations, batch_performance)
+
+STEP = 1e-6
+
+def numeric_gradient(func, weights):
+
+    ## Central Finite Differences, One Asset at a Time
+    return np.array([(func(weights + STEP*e) - func(weights - STEP*e)) / (2*STEP) for e in np.eye(len(weights))])
+
+@pytest.fixture(params = [5, 40])
+def moments(request):
+    return portfolio_moments(synthetic_returns(request.param, 3))
+
+@pytest.fixture
+def weights(moments):
+    return np.random.default_rng(1).dirichlet(np.ones(len(moments.mean)))
+
+@pytest.mark.parametrize('target', ['max_sharpe_ratio', 'min_volatility'])
+def test_objective_jac_matches_finite_differences(moments, weights, target):
+    numeric = numeric_gradient(lambda x: portfolio_performance(x, moments, 2, target), weights)
+    assert np.allclose(portfolio_gradient(weights, moments, 2, target), numeric, rtol = 1e-4, atol = 1e-4)
+
+def test_return_constraint_jac_matches_finite_differences(moments, weights):
+
+    ## The Target-Return Equality Constraint Compounds (1+mean)**252
+    numeric = numeric_gradient(lambda x: portfolio_performance(x, moments)['Return Annual'], weights)
+    assert np.allclose(portfolio_gradient(weights, moments, target = 'return'), numeric, rtol = 1e-4, atol = 1e-4)
+
+def test_all_gradients_match_finite_differences(moments, weights):
+    gradien = portfolio_gradient(weights, moments, 2)
+    for key in ['Return Annual', 'Volatilitas Annual', 'Sharpe Ratio']:
+        numeric = numeric_gradient(lambda x: portfolio_performance(x, moments, 2)[key], weights)
+        assert np.allclose(gradien[key], numeric, rtol = 1e-4, atol = 1e-4), key
+
+def test_gradient_at_zero_variance_is_finite():
+    moments = Moments(np.array([0.001, 0.0005, 0.0002]), np.zeros((3, 3)))
+    weights = np.full(3, 1/3)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        gradien = portfolio_gradient(weights, moments, 2)
+    assert np.all(gradien['Volatilitas Annual'] == 0) and np.all(gradien['Sharpe Ratio'] == 0)
+    assert np.all(np.isfinite(gradien['Return Annual']))
+    assert np.all(portfolio_gradient(np.zeros(3), portfolio_moments(synthetic_returns(3, 1)), 2, 'min_volatility') == 0)
+
+def frontier_targets(moments, num_points = 20):
+    gmv = optimize(moments, 'min_volatility')
+    min_exp = portfolio_performance(gmv['x'], moments)['Return Annual']
+    max_exp = np.max(((1 + moments.mean)**252 - 1)*100)
+    return np.linspace(min_exp, max_exp - 1e-6*abs(max_exp), num_points)
+
+def test_warm_frontier_matches_cold_with_fewer_iterations():
+    moments = portfolio_moments(synthetic_returns(30, 3))
+    targets = frontier_targets(moments)
+    cold = efficient_frontier(moments, targets)
+    warm = efficient_frontier(moments, targets, warm_start = True)
+    cold_vol = batch_performance([x['x'] for x in cold], moments)['Volatilitas Annual']
+    warm_vol = batch_performance([x['x'] for x in warm], moments)['Volatilitas Annual']
+    assert np.allclose(warm_vol, cold_vol, rtol = 1e-3)
+
+    ## One Count per Target, in Target Order
+    cold_nit, warm_nit = frontier_iterations(cold), frontier_iterations(warm)
+    assert len(warm_nit) == len(targets) and np.all(warm_nit > 0)
+    assert list(cold_nit) == [x['nit'] for x in cold]
+    assert warm_nit.sum() < cold_nit.sum()
+
+def test_warm_frontier_keeps_target_order():
+    moments = portfolio_moments(synthetic_returns(10, 2))
+    targets = frontier_targets(moments, 8)
+    shuffled = targets[[3, 0, 7, 5, 1, 6, 2, 4]]
+    warm = efficient_frontier(moments, shuffled, warm_start = True)
+    achieved = batch_performance([x['x'] for x in warm], moments)['Return Annual']
+    assert np.allclose(achieved, shuffled, rtol = 1e-4)
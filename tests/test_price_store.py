@@ -0,0 +1,152 @@
+## Price Store: Cold Fill, Incremental Top-Up, Rebase Refetch and Atomic Writes Against a Local Fake Fetcher
+import os
+import datetime
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from port_engine.price_store import PriceStore, FIELDS
+
+DATES = pd.bdate_range('2024-01-01', '2024-03-29')
+
+class FakeFetcher:
+
+    ## Serves a Fixed Adjusted History per Ticker and Logs Every (Tickers, Start, End) Call
+    def __init__(self, tickers):
+        rng = np.random.default_rng(0)
+        self.history = {x: pd.DataFrame({'Adj Close': 100*np.cumprod(1 + rng.normal(0, 0.01, len(DATES))),
+                                         'Volume': rng.integers(1000, 5000, len(DATES)).astype(float)},
+                                        index = DATES) for x in tickers}
+        self.calls = []
+
+    def __call__(self, tickers, start_date, end_date):
+        self.calls.append((sorted(tickers), start_date, end_date))
+        return {x: self.history[x][(self.history[x].index >= pd.Timestamp(start_date))
+                                   & (self.history[x].index < pd.Timestamp(end_date))] for x in tickers}
+
+class Clock:
+
+    ## Settable Exchange Time, Starts After the Close of 2024-02-15
+    def __init__(self):
+        self.now = pd.Timestamp('2024-02-15 17:00', tz = 'Asia/Jakarta')
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def fetcher():
+    return FakeFetcher(['BBCA', 'TLKM'])
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+@pytest.fixture
+def store(tmp_path, fetcher, clock):
+    return PriceStore(str(tmp_path), fetcher, clock)
+
+def expected(fetcher, ticker, start, end):
+    frame = fetcher.history[ticker]
+    return frame[(frame.index >= pd.Timestamp(start)) & (frame.index <= pd.Timestamp(end))]
+
+def test_cold_fill_is_one_call_and_round_trips(store, fetcher):
+    prices = store.prices(['BBCA', 'TLKM'], datetime.date(2024, 1, 1))
+    assert fetcher.calls == [(['BBCA', 'TLKM'], datetime.date(2024, 1, 1), datetime.date(2024, 2, 16))]
+    for ticker in ['BBCA', 'TLKM']:
+        truth = expected(fetcher, ticker, '2024-01-01', '2024-02-15')
+        assert np.allclose(prices['Adj Close'][ticker].values, truth['Adj Close'].values)
+        assert np.allclose(prices['Volume'][ticker].values, truth['Volume'].values)
+    assert store.coverage('BBCA') == (datetime.date(2024, 1, 1), datetime.date(2024, 2, 16))
+
+    ## A Second Call Inside the Covered Range Needs No Fetch
+    store.prices(['TLKM'], datetime.date(2024, 1, 15))
+    assert len(fetcher.calls) == 1
+
+def test_partial_session_is_not_covered(store, fetcher, clock):
+    clock.now = pd.Timestamp('2024-02-15 11:00', tz = 'Asia/Jakarta')
+    store.update(['BBCA'], datetime.date(2024, 1, 1))
+    assert fetcher.calls[-1][2] == datetime.date(2024, 2, 15)
+
+def test_top_up_fetches_only_the_missing_tail(store, fetcher, clock):
+    store.update(['BBCA', 'TLKM'], datetime.date(2024, 1, 1))
+    clock.now = pd.Timestamp('2024-03-01 17:00', tz = 'Asia/Jakarta')
+    store.update(['BBCA', 'TLKM'], datetime.date(2024, 1, 1))
+
+    ## The Tail Starts at the Last Stored Bar, One Overlapping Row for the Rebase Check
+    assert fetcher.calls[1:] == [(['BBCA', 'TLKM'], datetime.date(2024, 2, 15), datetime.date(2024, 3, 2))]
+    prices = store.prices(['BBCA'], datetime.date(2024, 1, 1), update = False)
+    truth = expected(fetcher, 'BBCA', '2024-01-01', '2024-03-01')
+    assert list(prices.index) == list(truth.index)
+    assert np.allclose(prices['Adj Close']['BBCA'].values, truth['Adj Close'].values)
+
+def test_earlier_start_fetches_only_the_missing_head(store, fetcher):
+    store.update(['BBCA'], datetime.date(2024, 2, 1))
+    store.update(['BBCA'], datetime.date(2024, 1, 1))
+    assert fetcher.calls[1:] == [(['BBCA'], datetime.date(2024, 1, 1), datetime.date(2024, 2, 2))]
+    assert store.coverage('BBCA')[0] == datetime.date(2024, 1, 1)
+
+def test_rebase_triggers_a_full_refetch(store, fetcher, clock):
+    store.update(['BBCA', 'TLKM'], datetime.date(2024, 1, 1))
+
+    ## A 2:1 Split Back-Adjusts Every Earlier BBCA Close
+    fetcher.history['BBCA']['Adj Close'] /= 2
+    clock.now = pd.Timestamp('2024-03-01 17:00', tz = 'Asia/Jakarta')
+    store.update(['BBCA', 'TLKM'], datetime.date(2024, 1, 1))
+    assert fetcher.calls[1:] == [(['BBCA', 'TLKM'], datetime.date(2024, 2, 15), datetime.date(2024, 3, 2)),
+                                 (['BBCA'], datetime.date(2024, 1, 1), datetime.date(2024, 3, 2))]
+
+    ## Stored History is Entirely on the New Basis, No Fake -50% Day at the Seam
+    prices = store.prices(['BBCA'], datetime.date(2024, 1, 1), update = False)['Adj Close']['BBCA']
+    truth = expected(fetcher, 'BBCA', '2024-01-01', '2024-03-01')['Adj Close']
+    assert np.allclose(prices.values, truth.values)
+    assert prices.pct_change().min() > -0.1
+
+def test_replace_swaps_in_a_complete_file(store, tmp_path):
+    os.makedirs(str(tmp_path), exist_ok = True)
+    store.replace('BBCA', 'json', lambda f: f.write(b'{"start": "2024-01-01", "end": "2024-01-02"}'))
+
+    ## A Writer that Fails Midway Leaves the Old File and No Temporary Behind
+    def broken(f):
+        f.write(b'{"start": ')
+        raise RuntimeError('disk full')
+    with pytest.raises(RuntimeError):
+        store.replace('BBCA', 'json', broken)
+    with open(store.path('BBCA', 'json')) as f:
+        assert f.read() == '{"start": "2024-01-01", "end": "2024-01-02"}'
+    assert [x for x in os.listdir(str(tmp_path)) if x.endswith('.tmp')] == []
+
+def test_lock_serializes_concurrent_saves(store, fetcher):
+    frame = fetcher.history['BBCA']
+    store.save('BBCA', frame.iloc[:1], datetime.date(2024, 1, 1), datetime.date(2024, 1, 2))
+
+    ## A Save Started While Another Writer Holds the Lock Waits for It
+    holding, release, done = threading.Event(), threading.Event(), threading.Event()
+    def writer():
+        with store.locked('BBCA'):
+            holding.set()
+            release.wait(5)
+    thread = threading.Thread(target = writer)
+    thread.start()
+    holding.wait(5)
+    saver = threading.Thread(target = lambda: store.save('BBCA', frame.iloc[1:2], datetime.date(2024, 1, 2),
+                                                          datetime.date(2024, 1, 3)) and done.set())
+    saver.start()
+    assert not done.wait(0.3)
+    release.set()
+    thread.join()
+    saver.join()
+    assert done.is_set()
+
+    ## Many Writers at Once, Each Adds its Own Day and None is Lost
+    threads = [threading.Thread(target = store.save, args = ('BBCA', frame.iloc[i:i+1], frame.index[i].date(),
+                                                            frame.index[i].date() + datetime.timedelta(1)))
+               for i in range(2, 40)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    dates, values = store.load('BBCA')
+    assert len(dates) == 40
+    assert np.allclose(np.array(values)[:, FIELDS.index('Adj Close')], frame['Adj Close'].values[:40])
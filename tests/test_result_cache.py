@@ -0,0 +1,75 @@
+## Result Cache: Content Keys, Memory and Disk Tiers, Throttled Disk Pruning
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import result_cache
+from result_cache import ResultCache, cached, frame_key, make_key
+from port_engine import as_returns
+
+@pytest.fixture
+def frame():
+    dates = pd.bdate_range('2024-01-01', periods = 50)
+    values = np.random.default_rng(0).normal(0, 0.01, (50, 3))
+    return pd.DataFrame(values, index = dates, columns = ['BBCA', 'BMRI', 'TLKM'])
+
+def test_frame_key_follows_the_values(frame):
+    assert frame_key(frame) == frame_key(frame.copy())
+
+    ## Same Tickers and Date Range, Re-Adjusted Values: a Different Key
+    rebased = frame.copy()
+    rebased.iloc[10, 1] *= 1.5
+    assert frame_key(rebased) != frame_key(frame)
+    shifted = frame.copy()
+    shifted.index = shifted.index + pd.Timedelta(days = 1)
+    assert frame_key(shifted) != frame_key(frame)
+
+def test_frame_and_returns_matrix_keys_change_together(frame):
+    rebased = frame.copy()
+    rebased.iloc[-1] = 0
+    assert make_key('f', frame) != make_key('f', rebased)
+    assert make_key('f', as_returns(frame)) != make_key('f', as_returns(rebased))
+
+def test_cached_function_recomputes_for_new_values(frame):
+    calls = []
+    @cached(ResultCache(memory_mb = 1))
+    def total(my_data, scale = 1):
+        calls.append(1)
+        return float(np.asarray(my_data).sum())*scale
+    assert total(frame) == total(frame.copy())
+    assert len(calls) == 1
+    rebased = frame*2
+    assert total(rebased) == pytest.approx(2*total(frame))
+    assert len(calls) == 2
+
+def test_disk_tier_is_shared_between_caches(tmp_path):
+    first = ResultCache(disk_dir = str(tmp_path))
+    second = ResultCache(disk_dir = str(tmp_path))
+    first.put('a'*32, {'x': 1})
+    assert second.get('a'*32) == {'x': 1}
+    assert second.stats()['disk_hits'] == 1
+    assert [x for _, _, names in os.walk(str(tmp_path)) for x in names if x.endswith('.tmp')] == []
+
+def test_disk_is_walked_only_when_over_the_limit(tmp_path, monkeypatch):
+    walks = []
+    walk = os.walk
+    monkeypatch.setattr(result_cache.os, 'walk', lambda *args: walks.append(1) or walk(*args))
+    cache = ResultCache(disk_dir = str(tmp_path), disk_mb = 1)
+    payload = np.zeros(2500)
+    for i in range(200):
+        cache.put('{:032x}'.format(i), payload)
+
+    ## One Initial Measure, then a Walk Only Each Time the 1 MB Limit is Crossed, Not One per Write
+    assert 1 <= len(walks) <= 40
+    on_disk = sum(os.path.getsize(os.path.join(root, x)) for root, _, names in walk(str(tmp_path)) for x in names)
+    assert on_disk <= 2**20
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ResultCache(memory_mb = 0.5)
+    for i in range(10):
+        cache.put(str(i), np.zeros(10000))
+    stats = cache.stats()
+    assert stats['evictions'] > 0 and stats['memory_mb'] <= 0.5
+    assert cache.get('9') is not None and cache.get('0') is None
@@ -0,0 +1,73 @@
+## Solver Backends: the Active-Set QP Must Agree with the scipy Reference
+import numpy as np
+import pytest
+
+from benchmarks.bench_moments import synthetic_returns
+from port_engine import (Moments, portfolio_moments, portfolio_performance, optimize, efficient_return,
+                         active_set_qp, qp_frontier_point, get_solver)
+
+@pytest.fixture(scope = 'module', params = [5, 20])
+def moments(request):
+    return portfolio_moments(synthetic_returns(request.param, 5))
+
+@pytest.mark.parametrize('target', ['min_volatility', 'max_sharpe_ratio'])
+def test_optimize_backends_agree(moments, target):
+    reference = optimize(moments, target, 2)
+    qp = optimize(moments, target, 2, solver = 'qp')
+    assert qp['success']
+    assert qp['fun'] == pytest.approx(reference['fun'], rel = 1e-6)
+    assert np.allclose(qp['x'], reference['x'], atol = 1e-3)
+
+    ## Long-Only Budget Constraint
+    assert np.sum(qp['x']) == pytest.approx(1.0) and np.min(qp['x']) >= 0
+
+@pytest.mark.parametrize('share', [0.2, 0.5, 0.8])
+def test_efficient_return_backends_agree(moments, share):
+    gmv = optimize(moments, 'min_volatility')
+    min_exp = portfolio_performance(gmv['x'], moments)['Return Annual']
+    max_exp = np.max(((1 + moments.mean)**252 - 1)*100)
+    expectation = min_exp + share*(max_exp - min_exp)
+    reference = efficient_return(moments, expectation, 2)
+    qp = efficient_return(moments, expectation, 2, solver = 'qp')
+    assert reference['success'] and qp['success']
+    assert qp['fun'] == pytest.approx(reference['fun'], rel = 1e-6)
+    assert np.allclose(qp['x'], reference['x'], atol = 1e-3)
+    assert portfolio_performance(qp['x'], moments)['Return Annual'] == pytest.approx(expectation, rel = 1e-6)
+
+def test_bounds_are_active_at_the_optimum():
+
+    ## A High-Variance Asset Correlated with the Rest Gets No Weight in the GMV Portfolio
+    values = synthetic_returns(4, 5).values
+    values[:,0] = 3*values[:,1]
+    moments = portfolio_moments(values)
+    reference = optimize(moments, 'min_volatility')
+    qp = optimize(moments, 'min_volatility', solver = 'qp')
+    assert qp['x'][0] == 0.0
+    assert np.allclose(qp['x'], reference['x'], atol = 1e-3)
+
+def test_degenerate_kkt_falls_back_to_least_squares(monkeypatch):
+
+    ## Equal Means Make the Return Row a Multiple of the Budget Row, so the KKT Matrix is Singular
+    rng = np.random.default_rng(3)
+    factor = rng.normal(size = (4, 4))
+    moments = Moments(np.full(4, 0.0004), factor.dot(factor.T)*1e-4 + np.diag([1e-4, 2e-4, 3e-4, 4e-4]))
+    calls = []
+    lstsq = np.linalg.lstsq
+    monkeypatch.setattr(np.linalg, 'lstsq', lambda *args, **kwargs: calls.append(1) or lstsq(*args, **kwargs))
+    qp = qp_frontier_point(moments, 0.0004)
+    assert calls and qp['success']
+
+    ## The Return Constraint is Redundant, the Answer is the scipy GMV Portfolio
+    gmv = optimize(moments, 'min_volatility')
+    assert portfolio_performance(qp['x'], moments, target = 'min_volatility') == pytest.approx(gmv['fun'], rel = 1e-6)
+    assert np.allclose(qp['x'], gmv['x'], atol = 1e-3)
+
+def test_active_set_qp_reports_iteration_limit():
+    moments = portfolio_moments(synthetic_returns(10, 2))
+    start = np.full(10, 0.1)
+    result = active_set_qp(moments.cov, np.ones((1, 10)), start, max_iter = 1)
+    assert not result['success'] and result['nit'] == 1
+
+def test_unknown_solver_is_rejected():
+    with pytest.raises(ValueError):
+        get_solver('cvxpy')
@@ -0,0 +1,94 @@
+## Ticker Universe: Listing Parser Against a Saved Page, Offline Fallback and In-Memory Reuse
+import os
+import threading
+
+import pytest
+
+from port_engine import ticker_universe
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'idx_listing.html')
+
+@pytest.fixture
+def html():
+    with open(FIXTURE, 'rb') as f:
+        return f.read()
+
+@pytest.fixture(autouse = True)
+def empty_memory():
+    ticker_universe.memory.clear()
+    yield
+    ticker_universe.memory.clear()
+
+def test_parse_tickers_reads_the_listing_table(html):
+    assert ticker_universe.parse_tickers(html) == [['AALI', 'Astra Agro Lestari Tbk', '9 Desember 1997'],
+                                                   ['BBCA', 'Bank Central Asia Tbk', '31 Mei 2000'],
+                                                   ['GOTO', 'GoTo Gojek Tokopedia Tbk', '11 April 2022']]
+
+def test_parse_tickers_without_wikitable_class():
+    html = b'''<table><tr><th>Kode</th><th>Nama</th><th>Tanggal</th></tr>
+    <tr><td>IDX: TLKM</td><td>Telkom Indonesia (Persero) Tbk</td><td>14 November 1995</td></tr></table>'''
+    assert ticker_universe.parse_tickers(html) == [['TLKM', 'Telkom Indonesia (Persero) Tbk', '14 November 1995']]
+
+def test_parse_tickers_empty_page():
+    assert ticker_universe.parse_tickers(b'<html><body><p>Halaman tidak ditemukan</p></body></html>') == []
+
+def test_refresh_writes_versioned_cache(tmp_path, html):
+    path = str(tmp_path / 'tickers.json')
+    content = ticker_universe.refresh(path, lambda: html)
+    assert ticker_universe.read_cache(path) == content
+    assert content['version'] == ticker_universe.universe_version(ticker_universe.parse_tickers(html))
+
+def join_refresh():
+    for worker in threading.enumerate():
+        if worker.name == 'ticker-universe-refresh':
+            worker.join(5)
+
+def test_cold_start_offline_uses_bundled_snapshot(tmp_path):
+    calls = []
+    def offline():
+        calls.append(1)
+        raise OSError('offline')
+    content = ticker_universe.load_universe(path = str(tmp_path / 'tickers.json'), fetch = offline)
+    assert len(content['tickers']) > 0
+    assert 'BBCA' in [x[0] for x in content['tickers']]
+    join_refresh()
+
+    ## The Failure is Remembered, a Rerun Does Not Retry the Network Straight Away
+    assert ticker_universe.load_universe(path = str(tmp_path / 'tickers.json'), fetch = offline) is content
+    assert len(calls) == 1
+
+def test_cold_start_serves_snapshot_without_waiting(tmp_path, html):
+    path = str(tmp_path / 'tickers.json')
+    release = threading.Event()
+    def slow():
+        release.wait(5)
+        return html
+
+    ## The First Page Load Gets the Snapshot While the Download is Still Blocked
+    content = ticker_universe.load_universe(path = path, fetch = slow)
+    assert content['fetched_at'] is None and len(content['tickers']) > 3
+    release.set()
+    join_refresh()
+
+    ## Once the Background Download Lands, the Next Load Serves It
+    fresh = ticker_universe.load_universe(path = path, fetch = slow)
+    assert fresh['tickers'] == ticker_universe.parse_tickers(html)
+
+def test_concurrent_writers_never_leave_a_partial_cache(tmp_path, html):
+    path = str(tmp_path / 'tickers.json')
+    ticker_list = ticker_universe.parse_tickers(html)*200
+    threads = [threading.Thread(target = ticker_universe.write_cache, args = (ticker_list, path)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert ticker_universe.read_cache(path)['tickers'] == ticker_list
+    assert os.listdir(str(tmp_path)) == ['tickers.json']
+
+def test_fresh_cache_is_served_from_memory(tmp_path, html):
+    path = str(tmp_path / 'tickers.json')
+    ticker_universe.refresh(path, lambda: html)
+    first = ticker_universe.load_universe(path = path, fetch = lambda: html)
+    assert first['tickers'] == ticker_universe.parse_tickers(html)
+    os.remove(path)
+    assert ticker_universe.load_universe(path = path, fetch = lambda: html) is first